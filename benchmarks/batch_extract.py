@@ -0,0 +1,86 @@
+"""htmlextract批量模式吞吐基准
+
+本地HTTP服务器为每个请求增加固定延迟，模拟真实网站的响应时间，
+在不同并发数下批量提取同一组文章，输出耗时和吞吐，并检查结果与逐篇提取一致。
+
+    python benchmarks/batch_extract.py [文章数] [延迟秒数]
+"""
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dify_plugin  # noqa: F401  必须在创建线程之前导入（SDK会对标准库打补丁）
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from tools.htmlextract import HtmlExtractTool
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+CONCURRENCY_LEVELS = (1, 2, 4, 8, 16)
+PARAMS = {
+    'news-title': 'article-title main-title',
+    'news-content': 'content',
+    'news-tag': 'tags',
+    'news-source': 'source',
+    'cache_ttl': 0,
+}
+
+
+def serve(body, delay):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def invoke(params):
+    tool = HtmlExtractTool.__new__(HtmlExtractTool)
+    tool.response_type = ToolInvokeMessage
+    return [message.message for message in tool._invoke(params)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    with open(os.path.join(CORPUS, 'article_utf8.html'), 'rb') as f:
+        base = serve(f.read(), delay)
+    urls = [f'{base}/article/{i}.html' for i in range(count)]
+
+    # 逐篇提取的结果作为基准
+    reference = {}
+    for url in urls[:2]:
+        messages = invoke(dict(PARAMS, **{'news-url': url}))
+        reference = {m.variable_name: m.variable_value for m in messages if hasattr(m, 'variable_name')}
+
+    failed = False
+    for concurrency in CONCURRENCY_LEVELS:
+        start = time.perf_counter()
+        messages = invoke(dict(PARAMS, **{'news-urls': '\n'.join(urls), 'concurrency': concurrency}))
+        elapsed = time.perf_counter() - start
+        results = next(m.variable_value for m in messages if getattr(m, 'variable_name', None) == 'results')
+        same = all(
+            not record['error'] and all(record[name] == reference[name] for name in record if name in reference and name != 'url')
+            for record in results
+        )
+        failed = failed or not same or len(results) != count
+        print(f"并发 {concurrency:3}  {count}篇  耗时 {elapsed:6.2f}s  吞吐 {count / elapsed:6.1f}篇/s  结果一致: {same}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
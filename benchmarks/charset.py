@@ -0,0 +1,64 @@
+"""编码检测基准：旧的逐个编码尝试 vs 单次嗅探解码
+
+生成几MB的GBK/UTF-8中文新闻页面，比较两种方式的耗时并检查解码结果一致。
+
+    python benchmarks/charset.py [页面大小MB]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.charset import decode_html
+
+_PARAGRAPH = '<p>新华社北京电 记者从国家统计局获悉，今年前三季度国民经济运行总体平稳，就业形势保持稳定，居民消费价格温和上涨。</p>\n'
+# 「镕」「喆」不在GB2312中，放在页面末尾，使旧逻辑中的gb2312解码几乎跑完全文才失败
+_GBK_ONLY_TAIL = '<p>朱镕基 陶喆</p>\n'
+
+
+def build_page(size_mb, charset):
+    head = f'<!DOCTYPE html><html><head><meta charset="{charset}"><title>测试新闻</title></head><body>\n'
+    count = int(size_mb * 1024 * 1024 / len(_PARAGRAPH.encode('utf-8')))
+    text = head + _PARAGRAPH * count + _GBK_ONLY_TAIL + '</body></html>'
+    return text.encode(charset)
+
+
+def legacy_decode(content):
+    """旧的解码方式：依次尝试多种编码"""
+    for encoding in ['utf-8', 'gb2312', 'gbk', 'latin1']:
+        try:
+            return content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+
+
+def bench(func, *args, repeat=5):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    failed = False
+    for charset, content_type in (('gbk', 'text/html'), ('gbk', 'text/html; charset=GBK'), ('utf-8', 'text/html')):
+        body = build_page(size_mb, charset)
+        legacy_time, legacy_text = bench(legacy_decode, body)
+        new_time, new_text = bench(decode_html, body, content_type)
+        same = legacy_text == new_text
+        failed = failed or not same
+        print(
+            f"{charset:6} {content_type:24} {len(body) / 1024 / 1024:5.1f}MB  "
+            f"旧: {legacy_time * 1000:8.1f}ms  新: {new_time * 1000:8.1f}ms  "
+            f"加速: {legacy_time / new_time:5.1f}x  结果一致: {same}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
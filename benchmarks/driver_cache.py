@@ -0,0 +1,133 @@
+"""ChromeDriver路径缓存失效检查
+
+Chrome升级后，缓存文件（或XHB_CHROMEDRIVER）记录的驱动会与浏览器版本不匹配。
+用替身的selenium和webdriver_manager检查：驱动启动失败时会删除缓存、重新获取一次驱动并重试，
+之后不再重复下载；刚下载的驱动启动失败时直接报错，不会反复下载。任一检查失败时以非零状态码退出。
+
+    python benchmarks/driver_cache.py
+"""
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORK_DIR = tempfile.mkdtemp(prefix='xhb-driver-')
+os.environ['XHB_DRIVER_CACHE_FILE'] = os.path.join(WORK_DIR, 'chromedriver.json')
+os.environ.pop('XHB_CHROMEDRIVER', None)
+
+import dify_plugin  # noqa: E402,F401  与插件运行时一样先打gevent补丁
+
+import utils.browser as browser  # noqa: E402
+
+
+class SessionNotCreated(Exception):
+    pass
+
+
+class FakeDriver:
+    def __init__(self, path):
+        self.path = path
+
+    def set_page_load_timeout(self, timeout):
+        pass
+
+
+class FakeService:
+    def __init__(self, path):
+        self.path = path
+
+
+class FakeSelenium:
+    """只有working中的驱动能启动Chrome，其它路径模拟版本不匹配"""
+
+    def __init__(self, working):
+        self.working = working
+        self.starts = []
+
+    def Chrome(self, service, options):
+        self.starts.append(service.path)
+        if service.path != self.working:
+            raise SessionNotCreated(f"This version of ChromeDriver only supports an older Chrome: {service.path}")
+        return FakeDriver(service.path)
+
+
+def make_executable(name):
+    path = os.path.join(WORK_DIR, name)
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\n')
+    os.chmod(path, 0o755)
+    return path
+
+
+def reset(working, installed):
+    """清空进程内缓存的路径，替换selenium和webdriver_manager"""
+    browser._driver_path = None
+    browser._driver_path_installed = False
+    fake = FakeSelenium(working)
+    browser.load_selenium = lambda: {'webdriver': fake, 'Service': FakeService}
+    browser.build_chrome_options = lambda profile=None: None
+    installs = []
+
+    def install():
+        installs.append(installed)
+        return installed
+
+    browser._install_driver = install
+    return fake, installs
+
+
+def cached_path():
+    with open(browser.DRIVER_CACHE_FILE, encoding='utf-8') as f:
+        return json.load(f)['path']
+
+
+def main():
+    stale = make_executable('chromedriver-old')
+    fresh = make_executable('chromedriver-new')
+    failures = []
+
+    # 1. 缓存文件记录的驱动已过期：重新获取一次并改写缓存，之后直接复用
+    browser._write_driver_cache(stale)
+    fake, installs = reset(working=fresh, installed=fresh)
+    driver = browser.create_driver('full')
+    again = browser.create_driver('full')
+    print(f"过期缓存: 启动 {fake.starts}  下载 {len(installs)}次  缓存 {cached_path()}")
+    if driver.path != fresh or again.path != fresh:
+        failures.append("过期的缓存驱动没有被替换")
+    if len(installs) != 1:
+        failures.append(f"应只重新获取1次驱动，实际{len(installs)}次")
+    if cached_path() != fresh:
+        failures.append("缓存文件仍然记录过期的驱动")
+
+    # 2. XHB_CHROMEDRIVER指定的驱动已过期：同样重新获取一次
+    os.environ['XHB_CHROMEDRIVER'] = stale
+    fake, installs = reset(working=fresh, installed=fresh)
+    driver = browser.create_driver('full')
+    os.environ.pop('XHB_CHROMEDRIVER')
+    print(f"过期XHB_CHROMEDRIVER: 启动 {fake.starts}  下载 {len(installs)}次")
+    if driver.path != fresh or len(installs) != 1:
+        failures.append("XHB_CHROMEDRIVER指定的过期驱动没有被替换")
+
+    # 3. 刚下载的驱动也无法启动（如Chrome本身损坏）：直接报错，不重复下载
+    browser._remove_driver_cache()
+    fake, installs = reset(working=None, installed=fresh)
+    try:
+        browser.create_driver('full')
+        failures.append("驱动无法启动时应当报错")
+    except SessionNotCreated:
+        pass
+    print(f"新驱动也失败: 启动 {fake.starts}  下载 {len(installs)}次")
+    if len(installs) != 1 or len(fake.starts) != 1:
+        failures.append(f"刚下载的驱动失败后不应重试，实际下载{len(installs)}次、启动{len(fake.starts)}次")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""异步抓取引擎基准：一个事件循环上的并发抓取、单主机并发限制和取消
+
+启动若干个本地HTTP服务器（每个端口视为一个主机），每个请求增加固定延迟，
+通过fetch_many并发抓取，输出耗时、吞吐和线程数，并检查：
+- 每个主机同时处理的请求数不超过XHB_HOST_CONCURRENCY
+- 抓取期间线程数不随并发数增长（不计本地服务器的线程）
+- 提前停止读取结果后，尚未开始的请求被取消
+- 同时请求同一网址时只下载一次，只有发起下载的调用方计为未命中并写入缓存，其它调用方计为合并
+
+    python benchmarks/fetch_engine.py [网址数] [主机数] [延迟秒数]
+"""
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dify_plugin  # noqa: F401  必须在创建线程之前导入（SDK会对标准库打补丁）
+
+from utils.cache import get_response_cache
+from utils.engine import HOST_CONCURRENCY
+from utils.fetch import fetch, fetch_many
+
+BODY = b'<html><head><title>ok</title></head><body>' + b'x' * 2048 + b'</body></html>'
+
+
+class Host:
+    """一个本地服务器，记录收到的请求数和同时处理的最大请求数"""
+
+    def __init__(self, delay):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.requests = 0
+        host = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with host.lock:
+                    host.requests += 1
+                    host.active += 1
+                    host.peak = max(host.peak, host.active)
+                try:
+                    time.sleep(delay)
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(BODY)))
+                    self.end_headers()
+                    self.wfile.write(BODY)
+                finally:
+                    with host.lock:
+                        host.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        ThreadingHTTPServer.request_queue_size = 256
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def client_threads():
+    """除本地服务器处理请求的线程外的线程数"""
+    return sum(1 for thread in threading.enumerate() if 'process_request' not in thread.name)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    host_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    hosts = [Host(delay) for _ in range(host_count)]
+    urls = [f'{hosts[i % host_count].base}/page/{i}' for i in range(count)]
+    failed = False
+
+    # 预热：启动事件循环并建立HTTP客户端
+    fetch(urls[0], cache_ttl=0)
+
+    for concurrency in (16, 64, 256):
+        for host in hosts:
+            host.peak = 0
+        threads_before = client_threads()
+        threads_peak = threads_before
+        errors = 0
+        start = time.perf_counter()
+        for _, _, response, error in fetch_many(urls, cache_ttl=0, concurrency=concurrency):
+            errors += error is not None
+            threads_peak = max(threads_peak, client_threads())
+        elapsed = time.perf_counter() - start
+        peak = max(host.peak for host in hosts)
+        ok = errors == 0 and peak <= HOST_CONCURRENCY and threads_peak <= threads_before + 2
+        failed = failed or not ok
+        print(f"并发 {concurrency:3}  {count}个网址/{host_count}个主机  耗时 {elapsed:6.2f}s  "
+              f"吞吐 {count / elapsed:7.1f}个/s  单主机峰值 {peak}（上限 {HOST_CONCURRENCY}）  "
+              f"线程 {threads_before}→{threads_peak}  失败 {errors}")
+
+    # 单主机：并发数高于单主机上限时，同一主机同时处理的请求数仍不超过上限
+    host = hosts[0]
+    host.peak = 0
+    single = [f'{host.base}/single/{i}' for i in range(HOST_CONCURRENCY * 4)]
+    start = time.perf_counter()
+    errors = sum(error is not None for _, _, _, error in fetch_many(single, cache_ttl=0, concurrency=64))
+    elapsed = time.perf_counter() - start
+    ok = errors == 0 and host.peak <= HOST_CONCURRENCY
+    failed = failed or not ok
+    print(f"单主机 {len(single)}个网址  并发 64  耗时 {elapsed:6.2f}s  主机峰值 {host.peak}（上限 {HOST_CONCURRENCY}）  失败 {errors}")
+
+    # 取消：只读取前几个结果就停止，剩余请求不应再发出
+    for host in hosts:
+        host.requests = 0
+    downloads = fetch_many(urls, cache_ttl=0, concurrency=32)
+    for _ in range(5):
+        next(downloads)
+    downloads.close()
+    time.sleep(delay * 3)
+    sent = sum(host.requests for host in hosts)
+    cancelled = sent < count
+    failed = failed or not cancelled
+    print(f"提前停止: 读取5个结果后停止，服务器共收到 {sent}/{count} 个请求，剩余请求已取消: {cancelled}")
+
+    # 合并：同时请求同一网址（经过缓存），只下载、计数和写入缓存一次
+    host = hosts[0]
+    host.requests = 0
+    callers = 8
+    cache = get_response_cache()
+    before = cache.stats()
+    same = [f'{host.base}/coalesce/{time.time_ns()}'] * callers
+    errors = sum(error is not None for _, _, _, error in fetch_many(same, cache_ttl=60, concurrency=callers))
+    after = cache.stats()
+    delta = {name: after[name] - before[name] for name in ('misses', 'coalesced', 'stores')}
+    ok = errors == 0 and host.requests == 1 and delta == {'misses': 1, 'coalesced': callers - 1, 'stores': 1}
+    failed = failed or not ok
+    print(f"合并: {callers}个调用方同时请求同一网址，服务器收到 {host.requests} 个请求，缓存统计变化 {delta}  失败 {errors}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""listlink链接提取规模基准：旧的逐项列表去重 vs 按身份/有序集合去重
+
+生成包含1k～50k个链接的合成列表页，分别统计解析耗时和提取耗时，
+检查新旧实现的结果完全一致。旧实现是平方级的，只在5k及以下规模运行（10k时单次提取已超过2分钟）。
+
+    python benchmarks/listlink_links.py
+"""
+import os
+import re
+import sys
+import time
+from urllib.parse import urljoin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dify_plugin  # noqa: F401  与插件运行时保持一致的导入顺序
+
+from tools.listlink import ListLinkTool
+from utils.parser import make_link_document, make_soup
+
+SIZES = (1000, 5000, 10000, 50000)
+LEGACY_MAX_SIZE = 5000
+BASE_URL = 'http://news.example.com/list/index.html'
+
+# (boxclass, subclass, aclass, link, blockurl)
+CASES = [
+    ('news-list', '', '', '', 'ad.example.com,/tag/'),
+    ('list-box news-list', '<li>', '', '', 'javascript'),
+    ('news-list', 'item', '', 'http://news.example.com', ''),
+    ('news-list', '', 'title-link', '', 'detail-9'),
+]
+
+
+def build_page(anchors):
+    """每5个链接中有1个重复、1个广告、1个标签页，并嵌套一层同类容器"""
+    items = []
+    for i in range(anchors):
+        if i % 5 == 1:
+            href = f'/article/{i - 1}.html'
+        elif i % 5 == 2:
+            href = f'http://ad.example.com/click?id={i}'
+        elif i % 5 == 3:
+            href = f'/tag/{i % 97}/'
+        else:
+            href = f'/article/{i}.html' if i % 2 else f'detail-{i}.html'
+        items.append(f'<li class="item"><a class="title-link" href="{href}">新闻标题{i}</a><span>2024-01-01</span></li>')
+    half = len(items) // 2
+    return ('<html><head><title>列表</title></head><body><div class="nav"><a href="/">首页</a></div>'
+            '<div class="list-box news-list"><ul>' + ''.join(items[:half]) + '</ul>'
+            '<div class="news-list"><ul>' + ''.join(items[half:]) + '</ul></div></div></body></html>')
+
+
+class LegacyListLink(ListLinkTool):
+    """优化前的链接提取实现，仅用于对比"""
+
+    def _extract_links(self, soup, boxclass, subclass, aclass, base_url, original_url, blockurl=''):
+        links = []
+        box_classes = self._parse_class_names(boxclass)
+        parent_elements = self._find_elements_by_classes(soup, box_classes)
+        if not parent_elements:
+            return links
+        for parent_element in parent_elements:
+            if aclass:
+                a_classes = self._parse_class_names(aclass)
+                a_elements = self._find_elements_by_classes(parent_element, a_classes, tag='a')
+            elif subclass:
+                if self._is_html_tag(subclass):
+                    sub_elements = parent_element.find_all(self._extract_tag_name(subclass))
+                else:
+                    sub_elements = self._find_elements_by_classes(parent_element, self._parse_class_names(subclass))
+                a_elements = []
+                for sub_element in sub_elements:
+                    a_elements.extend(sub_element.find_all('a', href=True))
+            else:
+                a_elements = parent_element.find_all('a', href=True)
+            for a_element in a_elements:
+                href = a_element.get('href')
+                if href:
+                    if base_url:
+                        if href.startswith('/'):
+                            full_url = base_url.rstrip('/') + href
+                        elif href.startswith('http'):
+                            full_url = href
+                        else:
+                            full_url = base_url.rstrip('/') + '/' + href
+                    else:
+                        full_url = urljoin(original_url, href)
+                    if self._should_block_url(full_url, blockurl):
+                        continue
+                    if full_url not in links:
+                        links.append(full_url)
+        return links
+
+    def _find_elements_by_classes(self, soup, class_list, tag=None):
+        elements = []
+        if not class_list:
+            return elements
+        if len(class_list) > 1:
+            selector = '.' + '.'.join(class_list)
+            if tag:
+                selector = tag + selector
+            elements.extend(soup.select(selector))
+        if not elements:
+            for class_name in class_list:
+                elements.extend(soup.find_all(tag, class_=class_name) if tag else soup.find_all(class_=class_name))
+        if not elements:
+            for class_name in class_list:
+                pattern = re.compile(class_name)
+                elements.extend(soup.find_all(tag, class_=pattern) if tag else soup.find_all(class_=pattern))
+        unique_elements = []
+        for element in elements:
+            if element not in unique_elements:
+                unique_elements.append(element)
+        return unique_elements
+
+    def _should_block_url(self, url, blockurl):
+        if not url or url.strip() == '' or url.strip() == '#' or url.lower().startswith('javascript:'):
+            return True
+        if not blockurl or not blockurl.strip():
+            return False
+        for keyword in self._parse_class_names(blockurl):
+            if keyword and keyword.strip() and keyword.strip().lower() in url.lower():
+                return True
+        return False
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    new_tool = ListLinkTool.__new__(ListLinkTool)
+    legacy_tool = LegacyListLink.__new__(LegacyListLink)
+    failed = False
+    for size in SIZES:
+        html = build_page(size)
+        for label, build in (('lexbor', make_link_document), ('bs4', make_soup)):
+            parse_time, soup = timed(build, html)
+            for boxclass, subclass, aclass, link, blockurl in CASES:
+                args = (soup, boxclass, subclass, aclass, link, BASE_URL, blockurl)
+                new_time, new_links = timed(new_tool._extract_links, *args)
+                line = (f"{size:6} {label:6} {boxclass:20} {subclass or aclass or '-':12} "
+                        f"解析 {parse_time * 1000:8.1f}ms  提取 {new_time * 1000:8.1f}ms  链接 {len(new_links):6}")
+                if size <= LEGACY_MAX_SIZE:
+                    legacy_time, legacy_links = timed(legacy_tool._extract_links, *args)
+                    same = legacy_links == new_links
+                    failed = failed or not same
+                    line += f"  旧提取 {legacy_time * 1000:9.1f}ms  加速 {legacy_time / new_time:6.1f}x  结果一致: {same}"
+                print(line)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
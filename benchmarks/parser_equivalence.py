@@ -0,0 +1,135 @@
+"""解析器后端一致性检查与耗时对比
+
+用 html.parser 的提取结果作为基准，检查每个已安装的后端（lxml、html5lib，
+listlink的selectolax快速路径，以及htmlextract的局部解析）在语料页面上的
+提取结果完全一致，并输出解析+提取耗时。
+任一后端结果不一致时以非零状态码退出。
+
+    python benchmarks/parser_equivalence.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dify_plugin  # noqa: F401  与插件运行时保持一致的导入顺序
+
+from tools.htmlextract import HtmlExtractTool
+from tools.listlink import ListLinkTool
+from utils.charset import decode_html
+from utils.parser import SELECTOLAX_AVAILABLE, available_parsers, make_link_document, make_partial_soup, make_soup
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+BASE_URL = 'http://news.example.com/list/index.html'
+
+# listlink参数组合：(页面, boxclass, subclass, aclass, link, blockurl)
+LINK_CASES = [
+    ('news_list_gbk.html', 'news-list', '', '', '', ''),
+    ('news_list_gbk.html', 'list-box news-list', '<li>', '', '', 'ad.example.com'),
+    ('news_list_gbk.html', 'list-box', 'item', '', 'http://news.example.com', ''),
+    ('news_list_gbk.html', 'news-list', '', 'title-link', '', 'detail'),
+    ('news_list_gbk.html', 'hot', '', '', '', ''),
+    ('news_list_gbk.html', 'list', '', '', '', ''),
+    ('messy_markup_gbk.html', 'newslist', '', '', '', ''),
+    ('messy_markup_gbk.html', 'list', '<li>', '', '', ''),
+    ('messy_markup_gbk.html', 'newslist', '', 'lnk', '', ''),
+    ('article_utf8.html', 'tags', '', '', '', ''),
+]
+
+# htmlextract参数组合：(页面, 类名参数)
+EXTRACT_CASES = [
+    ('article_utf8.html', ['article-title main-title', 'content', 'tags', 'source']),
+    ('article_utf8.html', ['title', 'article-content', 'tag', 'info']),
+    ('messy_markup_gbk.html', ['news-title', 'content-body', '', '']),
+    ('news_list_gbk.html', ['nav', 'list-box', '', 'page']),
+    ('portal_article_utf8.html', ['article-title', 'article-body', 'article-tags', 'article-source']),
+]
+
+
+def load(name):
+    with open(os.path.join(CORPUS, name), 'rb') as f:
+        return decode_html(f.read())
+
+
+def extract_links(html, parser, case):
+    tool = ListLinkTool.__new__(ListLinkTool)
+    _, boxclass, subclass, aclass, link, blockurl = case
+    if parser == 'selectolax':
+        soup = make_link_document(html, 'selectolax')
+    else:
+        soup = make_soup(html, parser)
+    return tool._extract_links(soup, boxclass, subclass, aclass, link, BASE_URL, blockurl)
+
+
+def extract_article(html, parser, case, partial=False):
+    tool = HtmlExtractTool.__new__(HtmlExtractTool)
+    if partial:
+        soup = make_partial_soup(html, [tool._parse_class_names(names) for names in case[1] if names], parser=parser)
+    else:
+        soup = make_soup(html, parser)
+    result = [tool._extract_content_by_class(soup, class_names) for class_names in case[1]]
+    result.append(tool._extract_meta_content(soup, 'keywords'))
+    result.append(tool._extract_meta_content(soup, 'description'))
+    return result
+
+
+def timed(func, *args, repeat=5):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def peak_memory(func, *args):
+    """返回一次调用期间Python分配内存的峰值（MB）"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    failures = 0
+    link_parsers = available_parsers() + (['selectolax'] if SELECTOLAX_AVAILABLE else [])
+    print(f"可用后端: {', '.join(link_parsers)}")
+
+    for case in LINK_CASES:
+        html = load(case[0])
+        reference_time, reference = timed(extract_links, html, 'html.parser', case)
+        for parser in link_parsers:
+            elapsed, result = timed(extract_links, html, parser, case)
+            ok = result == reference
+            failures += not ok
+            print(f"listlink    {case[0]:24} {case[1]:20} {parser:12} {elapsed * 1000:7.2f}ms "
+                  f"({reference_time / elapsed:4.1f}x) {'OK' if ok else 'MISMATCH'}")
+            if not ok:
+                print(f"    期望: {reference}\n    实际: {result}")
+
+    for case in EXTRACT_CASES:
+        html = load(case[0])
+        reference_time, reference = timed(extract_article, html, 'html.parser', case)
+        for parser in available_parsers():
+            for partial in (False, True):
+                elapsed, result = timed(extract_article, html, parser, case, partial)
+                ok = result == reference
+                failures += not ok
+                label = f"{parser}{'/局部' if partial else ''}"
+                peak = peak_memory(extract_article, html, parser, case, partial)
+                print(f"htmlextract {case[0]:24} {case[1][0]:20} {label:12} {elapsed * 1000:7.2f}ms "
+                      f"({reference_time / elapsed:4.1f}x) 峰值内存 {peak:6.1f}MB {'OK' if ok else 'MISMATCH'}")
+                if not ok:
+                    print(f"    期望: {reference}\n    实际: {result}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""主机礼貌调度基准：本地限流服务器下的固定并发与自适应并发对比
+
+本地HTTP服务器模拟会限流的新闻网站：同时处理的请求超过tolerated个时返回429
+（带Retry-After），否则延迟一段时间后正常返回。分别以固定并发（关闭自适应）和
+自适应并发抓取同一批网址，输出耗时、成功数、收到的429次数和最终并发上限，并检查：
+- 自适应模式全部成功
+- 自适应模式收到的429少于固定并发模式
+- 等待者刚被唤醒就被取消时，唤醒转交给下一个等待者（不会丢失空出的槽位）
+
+    python benchmarks/politeness.py [网址数] [可容忍并发数] [延迟秒数]
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dify_plugin  # noqa: F401  必须在创建线程之前导入（SDK会对标准库打补丁）
+
+from utils.engine import get_engine
+from utils.fetch import fetch_many
+from utils.politeness import HostScheduler
+
+BODY = b'<html><head><title>ok</title></head><body>ok</body></html>'
+
+
+class ThrottlingSite:
+    """同时处理的请求超过tolerated个时返回429的本地服务器"""
+
+    def __init__(self, tolerated, delay, retry_after=1):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.served = 0
+        self.throttled = 0
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with site.lock:
+                    site.active += 1
+                    allowed = site.active <= tolerated
+                    if not allowed:
+                        site.throttled += 1
+                try:
+                    if not allowed:
+                        self.send_response(429)
+                        self.send_header('Retry-After', str(retry_after))
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    time.sleep(delay)
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(BODY)))
+                    self.end_headers()
+                    self.wfile.write(BODY)
+                    with site.lock:
+                        site.served += 1
+                finally:
+                    with site.lock:
+                        site.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        ThreadingHTTPServer.request_queue_size = 256
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.netloc = f'127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def crawl(site, count, adaptive):
+    scheduler = get_engine().scheduler(site.netloc)
+    if not adaptive:
+        scheduler.adaptive = False
+        scheduler.limit = float(scheduler.max_limit)
+    urls = [f'http://{site.netloc}/article/{i}' for i in range(count)]
+    start = time.perf_counter()
+    errors = sum(error is not None for _, _, _, error in fetch_many(urls, cache_ttl=0, concurrency=16))
+    return time.perf_counter() - start, count - errors, scheduler.stats()
+
+
+async def _cancel_after_wake():
+    """并发上限为1：释放槽位唤醒B后、B恢复运行前取消B，C应当拿到槽位"""
+    scheduler = HostScheduler(1, rate=0, adaptive=False)
+    await scheduler.acquire()
+    woken = asyncio.ensure_future(scheduler.acquire())
+    waiting = asyncio.ensure_future(scheduler.acquire())
+    await asyncio.sleep(0.01)
+    scheduler.release()
+    woken.cancel()
+    try:
+        await asyncio.wait_for(waiting, timeout=1)
+    except asyncio.TimeoutError:
+        return False
+    return scheduler.active == 1
+
+
+def check_cancel_after_wake():
+    return asyncio.new_event_loop().run_until_complete(_cancel_after_wake())
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    tolerated = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+    results = {}
+    for adaptive in (False, True):
+        site = ThrottlingSite(tolerated, delay)
+        elapsed, succeeded, stats = crawl(site, count, adaptive)
+        results[adaptive] = (succeeded, site.throttled)
+        label = '自适应' if adaptive else '固定并发'
+        print(f"{label:6}  {count}个网址  可容忍并发 {tolerated}  耗时 {elapsed:6.2f}s  成功 {succeeded:3}  "
+              f"收到429 {site.throttled:3}次  最终并发上限 {stats['limit']}  减半 {stats['decreases']}次")
+
+    ok = results[True][0] == count and results[True][1] < results[False][1]
+    print(f"自适应模式全部成功且429更少: {ok}")
+    handed_over = check_cancel_after_wake()
+    print(f"唤醒后被取消时转交给下一个等待者: {handed_over}")
+    return 0 if ok and handed_over else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
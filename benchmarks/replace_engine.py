@@ -0,0 +1,115 @@
+"""替换/删除引擎基准：逐个目标str.replace vs 单次扫描的MultiReplacer
+
+生成长篇文章正文和几百个套话短语（互不重叠，两种方式结果应完全一致），
+分别比较按原有逐个目标循环和单次扫描的耗时；再检查替换与删除相互影响的参数组合
+（先替换后删除的顺序）结果与原来一致，并演示同一步内目标重叠时的处理规则。
+
+    python benchmarks/replace_engine.py [删除目标数] [正文KB]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.plan import article_plan
+from utils.replace import MultiReplacer
+
+_SENTENCE = '记者从有关部门获悉，今年以来全市经济运行总体平稳，重点项目建设稳步推进，居民收入持续增加。'
+_CHARS = '新闻网讯编辑来源责任声明本文转载请注明出处更多精彩内容关注官方微信扫码下载客户端'
+
+
+def build_rules(count, seed=1):
+    """生成互不为子串的套话短语（以不会出现在正文中的「【」开头）和20条替换规则"""
+    rng = random.Random(seed)
+    phrases = set()
+    while len(phrases) < count:
+        phrases.add('【' + ''.join(rng.choice(_CHARS) for _ in range(rng.randint(4, 12))) + '】')
+    deletions = sorted(phrases)
+    replacements = [('全市', '本市'), ('记者', '本报记者')] + [(f'〔旧词{i}〕', f'〔新词{i}〕') for i in range(18)]
+    return replacements, deletions
+
+
+def build_text(size_kb, deletions, seed=2):
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size_kb * 1024:
+        part = rng.choice(deletions) if rng.random() < 0.2 else _SENTENCE
+        parts.append(part)
+        length += len(part.encode('utf-8'))
+    return ''.join(parts)
+
+
+def legacy_rewrite(text, replacements, deletions):
+    """原有实现：先逐个替换，再逐个删除"""
+    for target, new in replacements:
+        text = text.replace(target, new)
+    for target in deletions:
+        text = text.replace(target, '')
+    return text
+
+
+def plan_rewrite(plan, text):
+    """提取计划的实现：先一次扫描替换，再一次扫描删除"""
+    return plan.deleter.apply(plan.rewriter.apply(text))
+
+
+# 替换与删除相互影响的参数组合：(content-target, content-text, deletecontent, 正文)
+INTERACTION_CASES = [
+    ('A', 'B', 'B', 'xAx'),
+    ('广告', '推广', '推广', '本文含广告和推广内容'),
+    ('记者', '本报记者', '本报', '记者报道'),
+    ('旧', '新', '新旧', '新旧交替'),
+    ('A, C', 'B, D', 'BD, x', 'xACx'),
+]
+
+
+def bench(func, *args, repeat=5):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    size_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    replacements, deletions = build_rules(count)
+    failed = False
+
+    start = time.perf_counter()
+    plan = article_plan('title', 'content', '', '', ','.join(t for t, _ in replacements),
+                        ','.join(n for _, n in replacements), ','.join(deletions))
+    compile_time = time.perf_counter() - start
+
+    for kb in (2, 20, size_kb):
+        text = build_text(kb, deletions)
+        legacy_time, expected = bench(legacy_rewrite, text, replacements, deletions)
+        new_time, result = bench(plan_rewrite, plan, text)
+        same = result == expected
+        failed = failed or not same
+        print(f"正文 {kb:4}KB  目标 {len(replacements) + len(deletions):4}个  旧: {legacy_time * 1000:8.2f}ms  "
+              f"新: {new_time * 1000:7.2f}ms  加速 {legacy_time / new_time:5.1f}x  结果一致: {same}")
+    print(f"编译 {len(replacements) + len(deletions)} 个目标: {compile_time * 1000:.1f}ms（每组参数只编译一次）")
+
+    for target, new, delete, text in INTERACTION_CASES:
+        case_plan = article_plan('title', 'content', '', '', target, new, delete)
+        expected = legacy_rewrite(text, case_plan.replacements, case_plan.delete_targets)
+        result = plan_rewrite(case_plan, text)
+        same = result == expected
+        failed = failed or not same
+        print(f"替换 {target}->{new} 删除 {delete}: {text!r} -> {result!r}  结果一致: {same}")
+
+    # 重叠目标：同一位置取最长匹配，替换结果不再被扫描
+    replacer = MultiReplacer([('广告', ''), ('广告位招租', '[已删除]'), ('新闻', '资讯'), ('资讯', '消息')])
+    print('重叠示例:', replacer.apply('广告位招租 广告 新闻资讯'))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
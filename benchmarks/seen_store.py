@@ -0,0 +1,63 @@
+"""已见链接库查询基准
+
+向临时SQLite库写入N条链接（默认100万），然后模拟定时运行：每次过滤一页100个链接
+（一半已见过），输出写入耗时、库文件大小和单次过滤的平均/最大耗时。
+平均耗时超过目标值时以非零状态码退出。
+
+    python benchmarks/seen_store.py [链接数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.seen import SeenStore
+
+# 单次过滤（100个链接）的平均耗时目标（毫秒），可通过环境变量覆盖
+FILTER_TARGET_MS = float(os.environ.get('XHB_SEEN_FILTER_TARGET_MS', '20'))
+BATCH = 10000
+PAGE = 100
+ROUNDS = 200
+
+
+def article_url(i):
+    return f'https://news.example.com/{2000 + i % 25}/{i % 12 + 1:02d}/article_{i}.html?from=list#top'
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with tempfile.TemporaryDirectory() as directory:
+        store = SeenStore(os.path.join(directory, 'seen.sqlite3'))
+
+        start = time.perf_counter()
+        for offset in range(0, total, BATCH):
+            store.mark('bench', [article_url(i) for i in range(offset, min(offset + BATCH, total))])
+        insert_time = time.perf_counter() - start
+        size_mb = sum(
+            os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+        ) / 1024 / 1024
+
+        timings = []
+        for round_index in range(ROUNDS):
+            # 一半是库中已有的旧链接，一半是新链接
+            old = [article_url((round_index * 7919 + i) % total) for i in range(PAGE // 2)]
+            new = [article_url(total + round_index * PAGE + i) for i in range(PAGE // 2)]
+            start = time.perf_counter()
+            unseen, skipped = store.filter_unseen('bench', old + new)
+            timings.append(time.perf_counter() - start)
+            assert skipped == PAGE // 2 and unseen == new, (skipped, len(unseen))
+        store.close()
+
+    average_ms = sum(timings) / len(timings) * 1000
+    print(f"写入 {total} 条: {insert_time:.1f}s  库文件 {size_mb:.1f}MB ({size_mb * 1024 * 1024 / total:.0f}B/条)")
+    print(f"过滤 {PAGE} 个链接: 平均 {average_ms:.2f}ms  最大 {max(timings) * 1000:.2f}ms")
+    if average_ms > FILTER_TARGET_MS:
+        print(f"FAIL: 平均过滤耗时 {average_ms:.2f}ms 超过目标 {FILTER_TARGET_MS}ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
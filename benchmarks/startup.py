@@ -0,0 +1,95 @@
+"""插件冷启动耗时基准
+
+在独立子进程中分别测量：dify_plugin SDK本身的导入耗时、在SDK之上导入全部
+工具模块的额外耗时，以及冷启动导入 main.py（即构造 Plugin、按SDK规则加载每个工具类）
+的总耗时，并检查静态模式下没有提前导入selenium。插件无法启动或超过目标值时以非零状态码退出，
+可直接用于CI。
+
+    python benchmarks/startup.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动耗时目标（秒），可通过环境变量覆盖
+TOOLS_IMPORT_TARGET = float(os.environ.get('XHB_TOOLS_IMPORT_TARGET', '0.3'))
+PLUGIN_BOOT_TARGET = float(os.environ.get('XHB_PLUGIN_BOOT_TARGET', '2.0'))
+
+_TOOLS_PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import dify_plugin, dify_plugin.entities.tool
+sdk_import = time.perf_counter() - start
+start = time.perf_counter()
+import tools.dom, tools.listlink, tools.htmlextract, tools.newscrawl, tools.xhbtool
+tools_import = time.perf_counter() - start
+selenium_loaded = any(name == 'selenium' or name.startswith('selenium.') for name in sys.modules)
+print(json.dumps({"sdk_import": sdk_import, "tools_import": tools_import, "selenium_loaded": selenium_loaded}))
+'''
+
+_BOOT_PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import main
+plugin_boot = time.perf_counter() - start
+selenium_loaded = any(name == 'selenium' or name.startswith('selenium.') for name in sys.modules)
+print(json.dumps({"plugin_boot": plugin_boot, "selenium_loaded": selenium_loaded}))
+'''
+
+
+def _run_probe(probe, runs):
+    results = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-c', probe],
+            cwd=ROOT, capture_output=True, text=True, timeout=60,
+        )
+        if proc.returncode != 0:
+            # 只保留异常信息，gevent退出时的噪声不影响判断
+            errors = [line for line in proc.stderr.splitlines() if line and not line.startswith((' ', 'Traceback'))]
+            raise RuntimeError(next((line for line in errors if 'Error' in line or 'Exception' in line), proc.stderr.strip()))
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def measure(boot_plugin=True, runs=3):
+    """运行若干次冷启动，返回每项耗时的最小值"""
+    results = _run_probe(_TOOLS_PROBE, runs)
+    best = {
+        "sdk_import": min(r["sdk_import"] for r in results),
+        "tools_import": min(r["tools_import"] for r in results),
+        "selenium_loaded": any(r["selenium_loaded"] for r in results),
+    }
+    if boot_plugin:
+        results = _run_probe(_BOOT_PROBE, runs)
+        best["plugin_boot"] = min(r["plugin_boot"] for r in results)
+        best["selenium_loaded"] = best["selenium_loaded"] or any(r["selenium_loaded"] for r in results)
+    return best
+
+
+def main():
+    boot_plugin = '--tools-only' not in sys.argv
+    try:
+        result = measure(boot_plugin=boot_plugin)
+    except RuntimeError as e:
+        print(f"FAIL: 插件无法启动: {e}")
+        return 1
+    failures = []
+    if result["selenium_loaded"]:
+        failures.append("selenium在导入工具模块时被提前加载")
+    if result["tools_import"] > TOOLS_IMPORT_TARGET:
+        failures.append(f"工具模块导入耗时（不含SDK） {result['tools_import']:.3f}s 超过目标 {TOOLS_IMPORT_TARGET}s")
+    if boot_plugin and result["plugin_boot"] > PLUGIN_BOOT_TARGET:
+        failures.append(f"Plugin启动耗时 {result['plugin_boot']:.3f}s 超过目标 {PLUGIN_BOOT_TARGET}s")
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
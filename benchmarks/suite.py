@@ -0,0 +1,433 @@
+"""离线基准套件：fetch / decode / parse / extract 分阶段耗时、吞吐和峰值内存，与基线比较
+
+本地HTTP服务器提供 benchmarks/corpus/ 中的语料页面（GBK和UTF-8新闻文章、超大列表页、
+大型门户文章页、SPA外壳页），逐个场景调用工具的 _invoke，统计：
+- 每次调用的总耗时（中位数）和吞吐（页/秒）
+- 各阶段耗时：fetch（下载）、render（浏览器渲染）、decode（解码）、parse（解析），
+  其余计为extract（提取和组装结果）；并发场景中各阶段为各线程耗时之和，不计算extract
+- 一次调用的Python峰值内存（tracemalloc，不含lxml等C扩展分配的内存）
+- 输出内容的摘要，提取结果变化时同样视为退化
+
+浏览器模式使用模拟的WebDriver：通过本地服务器取页面，SPA外壳页返回渲染后的页面，
+就绪检测立即返回，测量的是浏览器池、渲染合并和后续处理的开销，不需要Chrome。
+与 benchmarks/baselines.json 比较，耗时或内存超过基线的容忍范围、或输出摘要变化时以非零状态码退出。
+基线与机器有关，换机器（如CI）后先用 --update 生成一次基线。
+
+    python benchmarks/suite.py [场景名 ...]
+    python benchmarks/suite.py --update
+    python benchmarks/suite.py --latency-tolerance 0.3 --memory-tolerance 0.2
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# 本地服务器不需要礼貌限速，否则令牌桶会成为瓶颈
+os.environ.setdefault('XHB_HOST_RATE', '0')
+
+import dify_plugin  # noqa: F401  必须在创建线程之前导入（SDK会对标准库打补丁）
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+import tools.dom
+import tools.htmlextract
+import tools.listlink
+import utils.browser
+import utils.doccache
+import utils.render
+from tools.dom import DomHtmlTool
+from tools.htmlextract import HtmlExtractTool
+from tools.listlink import ListLinkTool
+from tools.newscrawl import NewsCrawlTool
+from utils.browser import SELENIUM_AVAILABLE
+from utils.doccache import get_document_cache
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(BENCH_DIR, 'corpus')
+BASELINES = os.path.join(BENCH_DIR, 'baselines.json')
+
+# 默认容忍范围：耗时超过基线50%、峰值内存超过基线25%视为退化
+LATENCY_TOLERANCE = 0.5
+MEMORY_TOLERANCE = 0.25
+# 低于该差值的变化视为噪声（毫秒、KB）
+MIN_LATENCY_DELTA_MS = 5
+MIN_MEMORY_DELTA_KB = 256
+# 模拟浏览器执行页面脚本的耗时
+MOCK_RENDER_SECONDS = 0.02
+
+ARTICLE_PARAMS = {
+    'news-title': 'article-title main-title news-title',
+    'news-content': 'content content-body',
+    'news-tag': 'tags news-tags',
+    'news-source': 'source news-source',
+    'cache_ttl': 0,
+}
+
+
+class Scenario:
+    def __init__(self, name, tool, params, pages=1, repeat=5, concurrent=False, browser=False, reuse_documents=False):
+        self.name = name
+        self.tool = tool
+        self.params = params
+        self.pages = pages  # 每次调用处理的页面数，用于计算吞吐
+        self.repeat = repeat
+        self.concurrent = concurrent
+        self.browser = browser
+        self.reuse_documents = reuse_documents  # 保留上一次调用解析的文档，测量重复提取同一页面
+
+
+def scenarios(base):
+    articles = [f'{base}/article/{i}.html' for i in range(20)]
+    return [
+        Scenario('listlink_gbk', ListLinkTool, {
+            'listurl': f'{base}/corpus/news_list_gbk.html', 'boxclass': 'news-list', 'cache_ttl': 0}),
+        Scenario('listlink_huge', ListLinkTool, {
+            'listurl': f'{base}/corpus/huge_list_utf8.html', 'boxclass': 'news-list', 'blockurl': 'ad.example.com',
+            'cache_ttl': 0}, repeat=3),
+        Scenario('listlink_spa_browser', ListLinkTool, {
+            'listurl': f'{base}/spa/list.html', 'boxclass': 'news-list', 'render_mode': 'browser'}, browser=True),
+        Scenario('listlink_spa_auto', ListLinkTool, {
+            'listurl': f'{base}/spa/list.html', 'boxclass': 'news-list', 'render_mode': 'auto', 'cache_ttl': 0},
+            browser=True),
+        Scenario('htmlextract_utf8', HtmlExtractTool, dict(ARTICLE_PARAMS, **{
+            'news-url': f'{base}/corpus/article_utf8.html'})),
+        Scenario('htmlextract_gbk', HtmlExtractTool, dict(ARTICLE_PARAMS, **{
+            'news-url': f'{base}/corpus/article_gbk.html', 'deletecontent': '图表,广告'})),
+        Scenario('htmlextract_portal', HtmlExtractTool, {
+            'news-url': f'{base}/corpus/portal_article_utf8.html', 'news-title': 'article-title',
+            'news-content': 'article-body', 'news-tag': 'article-tags', 'news-source': 'article-source',
+            'cache_ttl': 0}, repeat=3),
+        Scenario('htmlextract_portal_cached', HtmlExtractTool, {
+            'news-url': f'{base}/corpus/portal_article_utf8.html', 'news-title': 'article-title',
+            'news-content': 'article-body', 'news-tag': 'article-tags', 'news-source': 'article-source',
+            'cache_ttl': 0}, repeat=3, reuse_documents=True),
+        Scenario('htmlextract_batch', HtmlExtractTool, dict(ARTICLE_PARAMS, **{
+            'news-urls': '\n'.join(articles), 'concurrency': 8}), pages=len(articles), concurrent=True),
+        Scenario('domhtml_static', DomHtmlTool, {
+            'URL': f'{base}/corpus/portal_article_utf8.html', 'render_mode': 'static', 'output_mode': 'outline',
+            'cache_ttl': 0}, repeat=3),
+        Scenario('domhtml_browser', DomHtmlTool, {
+            'URL': f'{base}/spa/home.html', 'render_mode': 'browser', 'output_mode': 'compact'}, browser=True),
+        Scenario('newscrawl_huge', NewsCrawlTool, dict(ARTICLE_PARAMS, **{
+            'listurl': f'{base}/corpus/huge_list_utf8.html', 'boxclass': 'news-list', 'blockurl': 'ad.example.com',
+            'max_articles': 20, 'concurrency': 8}), pages=21, repeat=3, concurrent=True),
+    ]
+
+
+def read_corpus(name):
+    with open(os.path.join(CORPUS, name), 'rb') as f:
+        return f.read()
+
+
+def serve():
+    """本地语料服务器
+
+    - /corpus/<文件名>: 原样返回语料页面，GBK页面不在响应头中声明编码（靠<meta>检测）
+    - .../article/<n>.html: 偶数返回UTF-8文章，奇数返回GBK文章（列表页中的相对链接同样可用）
+    - /spa/<任意>: 返回SPA外壳页
+    """
+    pages = {name: read_corpus(name) for name in os.listdir(CORPUS) if name.endswith('.html')}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            name = None
+            if '/article/' in path:
+                number = re.sub(r'\D', '', path.rsplit('/', 1)[-1])
+                name = 'article_utf8.html' if int(number or 0) % 2 == 0 else 'article_gbk.html'
+            elif path.startswith('/corpus/'):
+                name = path[len('/corpus/'):]
+            elif path.startswith('/spa/'):
+                name = 'spa_shell.html'
+            body = pages.get(name)
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html' if 'gbk' in name else 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class MockDriver:
+    """模拟的WebDriver，只实现工具和浏览器池用到的接口"""
+
+    def __init__(self):
+        self.current_url = 'about:blank'
+        self.page_source = '<html><head></head><body></body></html>'
+        self.window_handles = ['main']
+        self.switch_to = self
+
+    def get(self, url):
+        self.current_url = url
+        if url == 'about:blank':
+            self.page_source = '<html><head></head><body></body></html>'
+            return
+        with urllib.request.urlopen(url, timeout=10) as response:
+            html = response.read().decode('utf-8', errors='replace')
+        if urlsplit(url).path.startswith('/spa/'):
+            # 模拟执行页面脚本，得到渲染后的DOM
+            time.sleep(MOCK_RENDER_SECONDS)
+            html = read_corpus('spa_rendered.html').decode('utf-8')
+        self.page_source = html
+
+    def find_element(self, by, value):
+        return self
+
+    def execute_script(self, script, *args):
+        # 就绪检测脚本：目标元素已存在、DOM已稳定、没有新的资源请求
+        if 'getElementsByClassName' in script:
+            return True
+        if 'MutationObserver' in script:
+            return ['complete', 10000]
+        return ['complete', 0]
+
+    def execute_cdp_cmd(self, command, params):
+        return {}
+
+    def window(self, handle):
+        pass
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def delete_all_cookies(self):
+        pass
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
+
+
+class StageTimer:
+    """累计各阶段耗时，并发时为各线程耗时之和"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}
+
+    def reset(self):
+        with self.lock:
+            self.totals = {}
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_iter(self, stage, func):
+        """生成器函数：只计入等待下一项的时间"""
+        def timed(*args, **kwargs):
+            iterator = func(*args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.add(stage, time.perf_counter() - start)
+                yield item
+        return timed
+
+
+STAGES = ('fetch', 'render', 'decode', 'parse')
+
+
+def instrument(timer):
+    """替换工具模块中各阶段的函数，调用时计入对应阶段"""
+    patches = [
+        ('fetch', tools.listlink, 'fetch'),
+        ('fetch', tools.htmlextract, 'fetch'),
+        ('fetch', tools.dom, 'fetch'),
+        ('render', ListLinkTool, '_render_with_browser'),
+        ('render', HtmlExtractTool, '_render_with_browser'),
+        ('render', DomHtmlTool, '_render_dynamic_html'),
+        ('decode', tools.listlink, 'decode_html'),
+        ('decode', tools.htmlextract, 'decode_html'),
+        ('decode', tools.dom, 'decode_html'),
+        ('parse', utils.doccache, 'make_link_document'),
+        ('parse', utils.doccache, 'make_partial_soup'),
+        ('parse', utils.doccache, 'make_soup'),
+        ('parse', tools.dom, 'make_soup'),
+        ('parse', utils.render, 'make_partial_soup'),
+        ('parse', utils.render, 'make_soup'),
+    ]
+    for stage, owner, name in patches:
+        setattr(owner, name, timer.wrap(stage, getattr(owner, name)))
+    tools.htmlextract.fetch_many = timer.wrap_iter('fetch', tools.htmlextract.fetch_many)
+    utils.browser.create_driver = lambda profile=None: MockDriver()
+
+
+def invoke(scenario):
+    if not scenario.reuse_documents:
+        get_document_cache().clear()
+    tool = scenario.tool.__new__(scenario.tool)
+    tool.response_type = ToolInvokeMessage
+    tool.runtime = tool.session = None
+    return [message.message for message in tool._invoke(dict(scenario.params))]
+
+
+def digest(messages, base):
+    """输出内容的摘要：网址中的本地端口统一替换，消息按内容排序（批量模式按完成顺序输出）"""
+    items = []
+    for message in messages:
+        if hasattr(message, 'json_object'):
+            value = ['json', message.json_object]
+        elif hasattr(message, 'variable_name'):
+            value = ['variable', message.variable_name, message.variable_value]
+        else:
+            value = ['text', getattr(message, 'text', str(message))]
+        items.append(json.dumps(value, ensure_ascii=False, sort_keys=True).replace(base, 'http://corpus'))
+    return hashlib.sha1('\n'.join(sorted(items)).encode('utf-8')).hexdigest()[:16]
+
+
+def measure(scenario, timer, base):
+    invoke(scenario)  # 预热：编译查找计划、启动浏览器池、记住渲染方式
+    totals = []
+    stages = {stage: [] for stage in STAGES}
+    messages = None
+    for _ in range(scenario.repeat):
+        timer.reset()
+        start = time.perf_counter()
+        messages = invoke(scenario)
+        totals.append(time.perf_counter() - start)
+        for stage in STAGES:
+            stages[stage].append(timer.totals.get(stage, 0.0))
+
+    tracemalloc.start()
+    try:
+        invoke(scenario)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(totals)
+    result = {
+        'median_ms': round(median * 1000, 2),
+        'pages_per_s': round(scenario.pages * len(totals) / sum(totals), 1),
+        'peak_kb': round(peak / 1024),
+        'digest': digest(messages, base),
+        'stages_ms': {stage: round(statistics.median(values) * 1000, 2) for stage, values in stages.items()},
+    }
+    if not scenario.concurrent:
+        result['stages_ms']['extract'] = round(max(0.0, median * 1000 - sum(result['stages_ms'].values())), 2)
+    return result
+
+
+def compare(name, result, baseline, latency_tolerance, memory_tolerance):
+    """返回退化原因列表，没有基线时返回None"""
+    if baseline is None:
+        return None
+    problems = []
+    if result['digest'] != baseline['digest']:
+        problems.append(f"输出变化 {baseline['digest']} -> {result['digest']}")
+    limit = baseline['median_ms'] * (1 + latency_tolerance)
+    if result['median_ms'] > limit and result['median_ms'] - baseline['median_ms'] > MIN_LATENCY_DELTA_MS:
+        problems.append(f"耗时 {baseline['median_ms']}ms -> {result['median_ms']}ms")
+    limit = baseline['peak_kb'] * (1 + memory_tolerance)
+    if result['peak_kb'] > limit and result['peak_kb'] - baseline['peak_kb'] > MIN_MEMORY_DELTA_KB:
+        problems.append(f"峰值内存 {baseline['peak_kb']}KB -> {result['peak_kb']}KB")
+    return problems
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES):
+        return {}
+    with open(BASELINES, encoding='utf-8') as f:
+        return json.load(f).get('scenarios', {})
+
+
+def save_baselines(results):
+    data = {
+        'environment': f"{platform.python_implementation()} {platform.python_version()} / {platform.machine()}",
+        'scenarios': results,
+    }
+    with open(BASELINES, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线基准套件')
+    parser.add_argument('names', nargs='*', help='只运行指定的场景')
+    parser.add_argument('--update', action='store_true', help='用本次结果更新基线')
+    parser.add_argument('--latency-tolerance', type=float, default=LATENCY_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    args = parser.parse_args()
+
+    base = serve()
+    timer = StageTimer()
+    instrument(timer)
+    baselines = load_baselines()
+    results = {}
+    failed = []
+    missing = []
+
+    print(f"{'场景':22} {'中位耗时':>10} {'吞吐(页/s)':>10} {'峰值内存':>10}  各阶段(ms)")
+    for scenario in scenarios(base):
+        if args.names and scenario.name not in args.names:
+            continue
+        if scenario.browser and not SELENIUM_AVAILABLE:
+            print(f"{scenario.name:22} 跳过（没有安装selenium）")
+            continue
+        result = results[scenario.name] = measure(scenario, timer, base)
+        stages = ' '.join(f"{stage}={value}" for stage, value in result['stages_ms'].items() if value)
+        print(f"{scenario.name:22} {result['median_ms']:>8.1f}ms {result['pages_per_s']:>10} "
+              f"{result['peak_kb']:>8}KB  {stages}")
+        problems = compare(scenario.name, result, baselines.get(scenario.name), args.latency_tolerance,
+                           args.memory_tolerance)
+        if problems is None:
+            missing.append(scenario.name)
+        elif problems:
+            failed.append(scenario.name)
+            for problem in problems:
+                print(f"{'':22} 退化: {problem}")
+
+    if args.update:
+        if args.names:
+            results = dict(baselines, **results)
+        save_baselines(results)
+        print(f"已更新基线: {os.path.relpath(BASELINES, ROOT)}")
+        return 0
+    if missing:
+        print(f"没有基线的场景（用 --update 生成）: {', '.join(missing)}")
+    if failed:
+        print(f"退化的场景: {', '.join(failed)}")
+        return 1
+    print("其余场景均在基线范围内" if missing else "全部场景均在基线范围内")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
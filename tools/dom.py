@@ -1,20 +1,34 @@
 from collections.abc import Generator
 from typing import Any
 import requests
-from bs4 import BeautifulSoup
 import json
-import time
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import os
+
+from bs4 import Comment
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
+from utils.browser import get_browser_pool, wait_for_body
+from utils.charset import decode_html
+from utils.doccache import cached_soup
+from utils.fetch import fetch
+from utils.metrics import count, count_nodes, instrumented, phase
+from utils.parser import make_soup
+from utils.readiness import wait_until_ready
+from utils.render import fetch_auto, render_once, resolve_render_mode
+
+# 精简输出时去掉的元素
+NOISE_TAGS = ['script', 'style', 'svg', 'noscript', 'template']
+# 结构大纲的限制
+OUTLINE_MAX_NODES = int(os.environ.get('XHB_OUTLINE_MAX_NODES', '500'))
+OUTLINE_TEXT_LIMIT = 200
+OUTLINE_ATTRIBUTES = frozenset(['id', 'class', 'href', 'src', 'name', 'role', 'type', 'alt', 'title'])
+# 分块输出的默认块大小（字符数）
+DEFAULT_CHUNK_SIZE = 20000
+
 class DomHtmlTool(Tool):
+    @instrumented('domhtml')
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         # 获取URL参数
         url = tool_parameters.get("URL", "")
@@ -23,84 +37,88 @@ class DomHtmlTool(Tool):
             yield self.create_text_message("请提供有效的URL")
             return
         
-        # 判断是否使用动态渲染模式
-        use_dynamic_rendering = tool_parameters.get("use_dynamic_rendering", True)
+        # 判断获取方式：static、browser或auto（render_mode未填写时按use_dynamic_rendering选择）
+        render_mode = resolve_render_mode(
+            tool_parameters.get("render_mode"), tool_parameters.get("use_dynamic_rendering", True)
+        )
+        wait_strategy = tool_parameters.get("wait_strategy", "auto")
+        wait_timeout = tool_parameters.get("wait_timeout", 10)
+        cache_ttl = tool_parameters.get("cache_ttl")
+        output_mode = tool_parameters.get("output_mode") or "full"
+        max_depth = int(tool_parameters.get("max_depth") or 3)
+        chunk_size = int(tool_parameters.get("chunk_size") or DEFAULT_CHUNK_SIZE)
             
         try:
             # 获取HTML内容
-            if use_dynamic_rendering:
+            if render_mode == "browser":
                 # 使用Selenium获取动态渲染后的HTML内容
-                html_content = self._get_dynamic_html(url)
+                html_content = self._get_dynamic_html(url, wait_strategy, wait_timeout)
+            elif render_mode == "auto":
+                # 先用普通模式，页面正文文字过少时才升级到浏览器
+                html_content = fetch_auto(
+                    url, None, lambda page_url: self._get_static_html(page_url, cache_ttl),
+                    lambda page_url: self._get_dynamic_html(page_url, wait_strategy, wait_timeout)
+                )
             else:
                 # 使用传统方式获取静态HTML内容
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                response = requests.get(url, headers=headers, timeout=10)
-                response.raise_for_status()  # 如果请求不成功则抛出异常
-                
-                # 尝试多种编码方式解码HTML内容
-                content = response.content
-                encodings = ['utf-8', 'gb2312', 'gbk', 'latin1']
-                
-                for encoding in encodings:
-                    try:
-                        html_content = content.decode(encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                else:
-                    # 如果所有编码都失败，使用默认的response.text
-                    html_content = response.text
-            
-            # 解析HTML内容
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # 提取网站标题
-            title = soup.title.string if soup.title else ""
-            
-            # 提取关键词
-            keywords = ""
-            keywords_meta = soup.find('meta', attrs={'name': 'keywords'}) or soup.find('meta', attrs={'property': 'keywords'})
-            if keywords_meta and keywords_meta.get('content'):
-                keywords = keywords_meta.get('content')
+                html_content = self._get_static_html(url, cache_ttl)
             
-            # 提取描述
-            description = ""
-            description_meta = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', attrs={'property': 'description'}) or soup.find('meta', attrs={'property': 'og:description'})
-            if description_meta and description_meta.get('content'):
-                description = description_meta.get('content')
+            # 解析HTML内容：精简模式会删除元素，使用单独解析的文档；其它模式复用同一内容已解析的文档
+            with phase('parse'):
+                soup = make_soup(html_content) if output_mode == "compact" else cached_soup(html_content)
+            count_nodes(soup)
+            count('pages')
             
-            # 处理可能的编码问题
-            # 尝试不同的编码方式，包括latin1和GB2312
-            encodings = ['latin1', 'gb2312', 'gbk']
-            
-            if title:
-                for encoding in encodings:
-                    try:
-                        title = title.encode(encoding).decode('utf-8')
-                        break
-                    except:
-                        pass
-            
-            if keywords:
-                for encoding in encodings:
-                    try:
-                        keywords = keywords.encode(encoding).decode('utf-8')
-                        break
-                    except:
-                        pass
-            
-            if description:
-                for encoding in encodings:
-                    try:
-                        description = description.encode(encoding).decode('utf-8')
-                        break
-                    except:
-                        pass
-            
-            # 输出HTML结构到text
-            yield self.create_text_message(html_content)
+            with phase('select'):
+                # 提取网站标题
+                title = str(soup.title.string) if soup.title and soup.title.string else ""
+                
+                # 提取关键词
+                keywords = ""
+                keywords_meta = soup.find('meta', attrs={'name': 'keywords'}) or soup.find('meta', attrs={'property': 'keywords'})
+                if keywords_meta and keywords_meta.get('content'):
+                    keywords = keywords_meta.get('content')
+                
+                # 提取描述
+                description = ""
+                description_meta = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', attrs={'property': 'description'}) or soup.find('meta', attrs={'property': 'og:description'})
+                if description_meta and description_meta.get('content'):
+                    description = description_meta.get('content')
+            
+            # 按输出模式生成返回的内容，除完整模式外不再返回整页HTML
+            if output_mode == "outline":
+                # 结构大纲：限制深度和节点数的JSON
+                html_content = None
+                with phase('serialize'):
+                    outline = json.dumps(self._extract_structure(soup, max_depth, OUTLINE_MAX_NODES), ensure_ascii=False)
+                soup = None
+                yield self.create_text_message(outline)
+                outline = None
+            elif output_mode == "compact":
+                # 精简HTML：去掉脚本、样式、SVG和注释
+                html_content = None
+                with phase('serialize'):
+                    compact_html = self._strip_noise(soup)
+                soup = None
+                yield self.create_text_message(compact_html)
+                compact_html = None
+            elif output_mode == "chunked":
+                # 分块输出：每条消息固定大小，避免一次序列化整页
+                soup = None
+                chunk_size = max(chunk_size, 1)
+                chunks = 0
+                for start in range(0, len(html_content), chunk_size):
+                    yield self.create_text_message(html_content[start:start + chunk_size])
+                    chunks += 1
+                html_content = None
+                yield self.create_variable_message("chunks", chunks)
+            else:
+                # 输出期间不再保留整棵解析树
+                soup = None
+                
+                # 输出HTML结构到text
+                yield self.create_text_message(html_content)
+                html_content = None
             
             # 单独输出每个变量
             yield self.create_variable_message("title", title)
@@ -109,70 +127,63 @@ class DomHtmlTool(Tool):
             yield self.create_variable_message("URL", url)
             
         except requests.exceptions.RequestException as e:
+            count('errors')
             yield self.create_text_message(f"获取网页内容时出错: {str(e)}")
         except Exception as e:
+            count('errors')
             yield self.create_text_message(f"处理网页结构时出错: {str(e)}")
     
-    def _get_dynamic_html(self, url):
-        """使用Selenium获取动态渲染后的HTML内容"""
-        # 配置Chrome选项
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")  # 无头模式
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        # 禁用Google API服务，避免GCM错误
-        chrome_options.add_argument("--disable-features=GCMChannelStatus")
-        chrome_options.add_argument("--disable-notifications")
-        chrome_options.add_argument("--disable-background-networking")
-        chrome_options.add_argument("--disable-sync")
-        chrome_options.add_argument("--disable-default-apps")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])  # 禁用日志输出
+    def _get_static_html(self, url, cache_ttl=None):
+        """使用共享会话获取静态HTML内容，请求不成功时抛出异常"""
+        response = fetch(url, timeout=10, cache_ttl=cache_ttl)
         
+        # 按BOM、响应头、<meta charset>的顺序确定编码，只解码一次；返回后原始字节随即释放
+        with phase('decode'):
+            return decode_html(response.content, response.headers.get('Content-Type'))
+    
+    def _get_dynamic_html(self, url, wait_strategy="auto", wait_timeout=10):
+        """使用Selenium获取动态渲染后的HTML内容，同时渲染同一网址的调用共享一次渲染"""
+        return render_once(
+            url, lambda: self._render_dynamic_html(url, wait_strategy, wait_timeout), None, wait_strategy, wait_timeout
+        )
+    
+    def _render_dynamic_html(self, url, wait_strategy="auto", wait_timeout=10):
+        """从浏览器池租用WebDriver渲染页面，失败时抛出异常"""
         try:
-            # 初始化WebDriver
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=chrome_options)
-            
-            # 设置页面加载超时
-            driver.set_page_load_timeout(30)
-            
-            # 访问URL
-            driver.get(url)
-            
-            # 等待页面加载完成（等待body元素可见）
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located(("tag name", "body")))
-            
-            # 额外等待一段时间，确保JavaScript执行完成
-            time.sleep(2)
-            
-            # 获取页面源代码
-            page_source = driver.page_source
-            
-            # 处理可能的编码问题
-            encodings = ['utf-8', 'gb2312', 'gbk', 'latin1']
-            html_content = page_source  # 默认值
-            
-            # 尝试不同的编码方式
-            for encoding in encodings:
-                try:
-                    # 先尝试编码再解码，处理可能的编码问题
-                    if isinstance(page_source, str):
-                        html_content = page_source.encode(encoding).decode('utf-8')
-                        break
-                except:
-                    continue
-            
-            # 关闭浏览器
-            driver.quit()
-            
-            return html_content
+            # 从共享浏览器池租用已启动的WebDriver
+            with get_browser_pool().lease() as driver:
+                # 访问URL
+                with phase('navigate'):
+                    driver.get(url)
+                
+                # 等待页面加载完成（等待body元素可见）
+                with phase('body_wait'):
+                    wait_for_body(driver, 10)
+                
+                # 等待JavaScript渲染完成（按策略自适应检测，超时上限wait_timeout秒）
+                with phase('ready_wait'):
+                    wait_until_ready(driver, wait_strategy, timeout=wait_timeout)
+                
+                # 获取页面源代码（WebDriver返回的已经是解码后的文本，无需再转换编码）
+                count('renders')
+                return driver.page_source
         except Exception as e:
             raise Exception(f"动态渲染获取失败: {str(e)}")
     
-    def _extract_structure(self, soup):
-        """提取网页的DOM结构"""
+    def _strip_noise(self, soup):
+        """去掉脚本、样式、SVG等不含正文的元素以及注释，返回精简后的HTML"""
+        for element in soup.find_all(NOISE_TAGS):
+            element.decompose()
+        for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+            comment.extract()
+        return str(soup)
+    
+    def _extract_structure(self, soup, max_depth=3, max_nodes=None):
+        """提取网页的DOM结构
+        
+        指定max_nodes时生成精简大纲：最多max_nodes个节点，跳过脚本、样式等元素，
+        只保留常用属性并截断过长的文本。
+        """
         result = {}
         
         # 获取标题
@@ -189,36 +200,55 @@ class DomHtmlTool(Tool):
         result["meta"] = meta_tags
         
         # 获取页面结构
-        body_structure = self._parse_element(soup.body) if soup.body else {}
+        budget = [max_nodes] if max_nodes else None
+        body_structure = self._parse_element(soup.body, max_depth, budget=budget) if soup.body else {}
         result["body"] = body_structure
         
         return result
     
-    def _parse_element(self, element, max_depth=3, current_depth=0):
-        """递归解析HTML元素结构"""
+    def _parse_element(self, element, max_depth=3, current_depth=0, budget=None):
+        """递归解析HTML元素结构，budget为剩余节点数（单元素列表，各层共享）"""
         if current_depth > max_depth:
             return {"type": element.name, "truncated": True}
             
         result = {"type": element.name}
+        if budget is not None:
+            budget[0] -= 1
         
         # 获取元素属性
         if element.attrs:
             result["attributes"] = {}
             for attr, value in element.attrs.items():
-                result["attributes"][attr] = value
+                if budget is None or attr in OUTLINE_ATTRIBUTES:
+                    result["attributes"][attr] = value
+            if not result["attributes"]:
+                del result["attributes"]
         
         # 获取元素内容
         if element.string and element.string.strip():
-            result["text"] = element.string.strip()
+            text = element.string.strip()
+            if budget is not None and len(text) > OUTLINE_TEXT_LIMIT:
+                text = text[:OUTLINE_TEXT_LIMIT] + "…"
+            result["text"] = text
         
         # 递归处理子元素
         children = []
+        omitted = 0
         for child in element.children:
             if child.name:  # 只处理有标签名的元素
-                child_structure = self._parse_element(child, max_depth, current_depth + 1)
+                if budget is not None:
+                    if child.name in NOISE_TAGS:
+                        continue
+                    if budget[0] <= 0:
+                        omitted += 1
+                        continue
+                child_structure = self._parse_element(child, max_depth, current_depth + 1, budget)
                 children.append(child_structure)
         
         if children:
             result["children"] = children
+        if omitted:
+            # 节点数用完后省略的子元素个数
+            result["omitted"] = omitted
             
         return result
@@ -1,26 +1,39 @@
 from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
 from typing import Any
+import json
+import logging
+import os
 import requests
-from bs4 import BeautifulSoup
 import re
-import time
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
-try:
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
-    from selenium.webdriver.chrome.service import Service
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    from webdriver_manager.chrome import ChromeDriverManager
-    SELENIUM_AVAILABLE = True
-except ImportError:
-    SELENIUM_AVAILABLE = False
+from utils.browser import POOL_SIZE, SELENIUM_AVAILABLE, get_browser_pool, wait_for_body
+from utils.charset import decode_html
+from utils.doccache import cached_partial_soup
+from utils.fetch import fetch, fetch_many
+from utils.metrics import count, count_nodes, instrumented, phase
+from utils.plan import ClassQuery, article_plan, class_query, meta_selectors, parse_class_names, parse_replacement_strings
+from utils.readiness import wait_until_ready
+from utils.render import fetch_auto, render_once, resolve_render_mode
+from utils.replace import compile_replacer
+
+logger = logging.getLogger(__name__)
+
+# 批量模式默认并发数
+BATCH_CONCURRENCY = int(os.environ.get('XHB_BATCH_CONCURRENCY', '4'))
+
+# 清理提取文本中的连续空白
+_WHITESPACE = re.compile(r'\s+')
+
+# 单篇文章输出的字段（不含url）
+ARTICLE_FIELDS = ("title", "content", "tags", "source", "keywords", "description")
 
 class HtmlExtractTool(Tool):
+    @instrumented('htmlextract')
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         # 获取参数
         news_url = tool_parameters.get("news-url", "")
@@ -31,9 +44,14 @@ class HtmlExtractTool(Tool):
         content_target = tool_parameters.get("content-target", "")
         content_text = tool_parameters.get("content-text", "")
         deletecontent = tool_parameters.get("deletecontent", "")
-        use_browser = tool_parameters.get('use_browser', False)
+        render_mode = resolve_render_mode(tool_parameters.get('render_mode'), tool_parameters.get('use_browser', False))
+        wait_strategy = tool_parameters.get('wait_strategy', 'auto')
+        wait_timeout = tool_parameters.get('wait_timeout', 10)
+        cache_ttl = tool_parameters.get('cache_ttl')
+        news_urls = self._parse_url_list(tool_parameters.get("news-urls", ""))
+        concurrency = tool_parameters.get("concurrency") or BATCH_CONCURRENCY
         
-        if not news_url:
+        if not news_url and not news_urls:
             yield self.create_text_message("请提供有效的新闻网址")
             return
             
@@ -41,174 +59,303 @@ class HtmlExtractTool(Tool):
             yield self.create_text_message("请提供标题和内容的CSS类名")
             return
         
+        if render_mode == 'browser' and not SELENIUM_AVAILABLE:
+            yield self.create_text_message("错误：使用浏览器模式需要安装selenium库，请运行: pip install selenium")
+            return
+        
+        options = {
+            "title_class": news_title_class,
+            "content_class": news_content_class,
+            "tag_class": news_tag_class,
+            "source_class": news_source_class,
+            "content_target": content_target,
+            "content_text": content_text,
+            "deletecontent": deletecontent,
+            "render_mode": render_mode,
+            "wait_strategy": wait_strategy,
+            "wait_timeout": wait_timeout,
+            "cache_ttl": cache_ttl,
+        }
+        
+        # 批量模式：同一组类名配置并发处理多个网址
+        if news_urls:
+            yield from self._invoke_batch(news_urls, options, concurrency)
+            return
+        
         try:
-            # 根据参数选择获取HTML内容的方式
-            if use_browser:
-                if not SELENIUM_AVAILABLE:
-                    yield self.create_text_message("错误：使用浏览器模式需要安装selenium库，请运行: pip install selenium")
-                    return
-                html_content = self._get_html_content_with_browser(news_url)
-            else:
-                html_content = self._get_html_content(news_url)
+            html_content = self._get_article_html(news_url, options)
             
             if not html_content:
                 yield self.create_text_message("无法获取网页内容")
                 return
             
-            # 解析HTML
-            soup = BeautifulSoup(html_content, 'html.parser')
+            article = self._extract_article(html_content, options)
+            # 生成器在输出期间会保留局部变量，提取完成后立即释放页面内容
+            html_content = None
             
-            # 提取标题
-            title = self._extract_content_by_class(soup, news_title_class)
+            # 输出提取的内容
+            for name in ARTICLE_FIELDS:
+                yield self.create_variable_message(name, article[name])
+            yield self.create_variable_message("url", news_url)
             
+        except requests.exceptions.RequestException as e:
+            count('errors')
+            yield self.create_text_message(f"获取网页内容时出错: {str(e)}")
+        except Exception as e:
+            count('errors')
+            yield self.create_text_message(f"处理HTML内容时出错: {str(e)}")
+    
+    def _invoke_batch(self, news_urls, options, concurrency):
+        """并发抓取和提取多篇文章，每完成一篇立即输出一条结果"""
+        results = [None] * len(news_urls)
+        for index, record in self._iter_articles(news_urls, options, min(int(concurrency), len(news_urls))):
+            results[index] = record
+            yield self.create_json_message(record)
+        
+        failed = sum(1 for record in results if record["error"])
+        yield self.create_variable_message("results", results)
+        yield self.create_variable_message("count", len(results) - failed)
+        yield self.create_variable_message("failed", failed)
+    
+    def _iter_articles(self, news_urls, options, concurrency):
+        """并发处理文章，按完成顺序产出(序号, 记录)
+        
+        news_urls可以是逐步产生网址的迭代器（如边抓列表页边发现的链接），有空位时立即提交。
+        普通模式下所有下载在抓取引擎的事件循环中并发进行，提取在当前线程中依次完成；
+        浏览器模式和自动模式在有界线程池中处理，浏览器模式的并发受浏览器池大小限制。
+        """
+        concurrency = max(1, int(concurrency))
+        if options["render_mode"] == "static":
+            downloads = fetch_many(news_urls, timeout=10, cache_ttl=options["cache_ttl"], concurrency=concurrency)
+            for index, url, response, error in downloads:
+                record = self._build_record(url, options, lambda: self._decode_response(response, error))
+                response = None
+                record["index"] = index
+                yield index, record
+            return
+        
+        if options["render_mode"] == "browser":
+            # 浏览器模式的并发受浏览器池大小限制，多开的线程只会排队等待租用
+            concurrency = min(concurrency, POOL_SIZE)
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="htmlextract")
+        pending = {}
+        try:
+            for index, url in enumerate(news_urls):
+                # 在当前上下文的副本中处理，耗时计入本次调用
+                future = executor.submit(contextvars.copy_context().run, self._process_article, url, options)
+                pending[future] = index
+                # 先输出已经完成的文章，不等待后续网址
+                for done in [f for f in pending if f.done()]:
+                    yield self._finish_article(pending, done)
+            for done in as_completed(list(pending)):
+                yield self._finish_article(pending, done)
+        finally:
+            # 调用方提前停止读取时取消尚未开始的任务
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _finish_article(self, pending, future):
+        index = pending.pop(future)
+        record = future.result()
+        record["index"] = index
+        return index, record
+    
+    def _process_article(self, news_url, options):
+        """抓取并处理单篇文章，失败时返回带错误信息的记录而不是抛出异常"""
+        return self._build_record(news_url, options, lambda: self._get_article_html(news_url, options))
+    
+    def _build_record(self, news_url, options, get_html):
+        """调用get_html获取页面并提取文章，失败时返回带错误信息的记录"""
+        record = {"url": news_url, "error": ""}
+        try:
+            html_content = get_html()
+            if not html_content:
+                record["error"] = "无法获取网页内容"
+            else:
+                record.update(self._extract_article(html_content, options))
+        except requests.exceptions.RequestException as e:
+            record["error"] = f"获取网页内容时出错: {str(e)}"
+        except Exception as e:
+            record["error"] = f"处理HTML内容时出错: {str(e)}"
+        if record["error"]:
+            count('errors')
+        return record
+    
+    def _decode_response(self, response, error):
+        """解码抓取引擎返回的响应，抓取失败时抛出原来的异常"""
+        if error is not None:
+            raise error
+        with phase('decode'):
+            return decode_html(response.content, response.headers.get('Content-Type'))
+    
+    def _get_article_html(self, news_url, options):
+        """根据获取方式（static、browser、auto）获取HTML内容"""
+        if options["render_mode"] == "static":
+            return self._get_html_content(news_url, options["cache_ttl"])
+        ready_classes = self._parse_class_names(options["content_class"])
+        fetch_browser = lambda url: self._get_html_content_with_browser(
+            url, ready_classes, options["wait_strategy"], options["wait_timeout"]
+        )
+        if options["render_mode"] == "browser":
+            return fetch_browser(news_url)
+        # 先用普通模式，news-content对应的元素不存在或为空时才升级到浏览器
+        return fetch_auto(
+            news_url, ready_classes, lambda url: self._get_html_content(url, options["cache_ttl"]), fetch_browser
+        )
+    
+    def _extract_article(self, html_content, options):
+        """从HTML中提取标题、内容、标签、来源和meta信息"""
+        # 类名查找方式和替换/删除规则按参数组合预先编译并跨调用缓存
+        plan = article_plan(
+            options["title_class"], options["content_class"], options["tag_class"], options["source_class"],
+            options["content_target"], options["content_text"], options["deletecontent"]
+        )
+        
+        # 局部解析HTML：只构建目标类名对应的子树以及<meta>、<title>；同一内容已解析过时直接复用
+        with phase('parse'):
+            soup = cached_partial_soup(html_content, plan.partial_classes)
+        count_nodes(soup)
+        count('pages')
+        
+        with phase('select'):
+            # 提取标题
+            title = self._extract_content_by_class(soup, plan.title)
+        
             # 提取内容
-            content = self._extract_content_by_class(soup, news_content_class)
-            
+            content = self._extract_content_by_class(soup, plan.content)
+        
             # 提取标签（可选）
             tags = ""
-            if news_tag_class:
-                tags = self._extract_content_by_class(soup, news_tag_class)
-            
+            if plan.tag is not None:
+                tags = self._extract_content_by_class(soup, plan.tag)
+        
             # 提取来源（可选）
             source = ""
-            if news_source_class:
-                source = self._extract_content_by_class(soup, news_source_class)
-            
+            if plan.source is not None:
+                source = self._extract_content_by_class(soup, plan.source)
+        
             # 提取meta标签中的keywords和description
             keywords = self._extract_meta_content(soup, "keywords")
             description = self._extract_meta_content(soup, "description")
-            
-            # 执行内容替换（如果有替换参数）
-            if content_target and content_text:
-                title = self._replace_content(title, content_target, content_text)
-                content = self._replace_content(content, content_target, content_text)
-                keywords = self._replace_content(keywords, content_target, content_text)
-                description = self._replace_content(description, content_target, content_text)
-            
-            # 执行内容删除（如果有删除参数）
-            if deletecontent:
-                title = self._delete_content(title, deletecontent)
-                content = self._delete_content(content, deletecontent)
-                tags = self._delete_content(tags, deletecontent)
-                source = self._delete_content(source, deletecontent)
-                keywords = self._delete_content(keywords, deletecontent)
-                description = self._delete_content(description, deletecontent)
-            
-            # 输出提取的内容
-            yield self.create_variable_message("title", title)
-            yield self.create_variable_message("content", content)
-            yield self.create_variable_message("tags", tags)
-            yield self.create_variable_message("source", source)
-            yield self.create_variable_message("keywords", keywords)
-            yield self.create_variable_message("description", description)
-            yield self.create_variable_message("url", news_url)
-            
-        except requests.exceptions.RequestException as e:
-            yield self.create_text_message(f"获取网页内容时出错: {str(e)}")
-        except Exception as e:
-            yield self.create_text_message(f"处理HTML内容时出错: {str(e)}")
-    
-    def _get_html_content(self, url):
-        """获取HTML内容"""
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
         
-        # 尝试多种编码方式解码HTML内容
-        content = response.content
-        encodings = ['utf-8', 'gb2312', 'gbk', 'latin1']
+            # 执行内容替换（只作用于标题、内容、关键词、描述），再执行删除，各自一次扫描完成全部目标
+            if plan.rewriter:
+                title = plan.rewriter.apply(title)
+                content = plan.rewriter.apply(content)
+                keywords = plan.rewriter.apply(keywords)
+                description = plan.rewriter.apply(description)
+            if plan.deleter:
+                title = plan.deleter.apply(title)
+                content = plan.deleter.apply(content)
+                tags = plan.deleter.apply(tags)
+                source = plan.deleter.apply(source)
+                keywords = plan.deleter.apply(keywords)
+                description = plan.deleter.apply(description)
         
-        for encoding in encodings:
-            try:
-                html_content = content.decode(encoding)
-                return html_content
-            except UnicodeDecodeError:
-                continue
+        return {
+            "title": title,
+            "content": content,
+            "tags": tags,
+            "source": source,
+            "keywords": keywords,
+            "description": description,
+        }
+    
+    def _parse_url_list(self, value):
+        """解析批量网址：支持JSON数组（如listlink输出的links），或用换行、逗号、空格分隔的网址"""
+        if not value:
+            return []
+        if isinstance(value, str):
+            value = value.strip()
+            if value.startswith('['):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    value = value.strip('[]').replace('"', ' ').replace("'", ' ')
+        if isinstance(value, str):
+            value = value.replace(',', ' ').split()
+        # 去重并保持原有顺序
+        return list(dict.fromkeys(str(url).strip() for url in value if url and str(url).strip()))
+    
+    def _get_html_content(self, url, cache_ttl=None):
+        """获取HTML内容"""
+        # 使用共享会话复用keep-alive连接
+        response = fetch(url, timeout=10, cache_ttl=cache_ttl)
         
-        # 如果所有编码都失败，使用默认的response.text
-        return response.text
+        # 按BOM、响应头、<meta charset>的顺序确定编码，只解码一次
+        with phase('decode'):
+            return decode_html(response.content, response.headers.get('Content-Type'))
     
-    def _get_html_content_with_browser(self, url):
+    def _get_html_content_with_browser(self, url, ready_classes=None, wait_strategy='auto', wait_timeout=10):
         """使用无头浏览器获取动态渲染的HTML内容"""
         if not SELENIUM_AVAILABLE:
             return None
         
-        driver = None
+        # 同时渲染同一网址的调用共享一次渲染，不重复占用浏览器
+        return render_once(
+            url, lambda: self._render_with_browser(url, ready_classes, wait_strategy, wait_timeout),
+            ready_classes, wait_strategy, wait_timeout
+        )
+    
+    def _render_with_browser(self, url, ready_classes=None, wait_strategy='auto', wait_timeout=10):
+        """从浏览器池租用WebDriver渲染页面，失败时返回None"""
         try:
-            # 配置Chrome选项
-            chrome_options = Options()
-            chrome_options.add_argument('--headless')  # 无头模式
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1920,1080')
-            chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-            
-            # 创建WebDriver实例（自动下载和管理ChromeDriver）
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=chrome_options)
-            driver.set_page_load_timeout(30)
-            
-            # 访问页面
-            driver.get(url)
-            
-            # 等待页面加载完成（等待body元素出现）
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            # 额外等待JavaScript执行
-            time.sleep(3)
-            
-            # 获取渲染后的HTML
-            html_content = driver.page_source
-            return html_content
+            # 从共享浏览器池租用已启动的WebDriver
+            with get_browser_pool().lease() as driver:
+                # 访问页面
+                with phase('navigate'):
+                    driver.get(url)
+                
+                # 等待页面加载完成（等待body元素出现）
+                with phase('body_wait'):
+                    wait_for_body(driver, 10)
+                
+                # 等待JavaScript渲染完成（优先等待目标类名的元素出现）
+                with phase('ready_wait'):
+                    wait_until_ready(driver, wait_strategy, ready_classes, timeout=wait_timeout)
+                
+                # 获取渲染后的HTML
+                count('renders')
+                html_content = driver.page_source
+                return html_content
             
         except Exception as e:
-            print(f"浏览器获取内容失败: {str(e)}")
+            logger.warning(f"浏览器获取内容失败: {str(e)}")
             return None
-        finally:
-            if driver:
-                driver.quit()
     
     def _extract_content_by_class(self, soup, class_names):
-        """根据CSS类名提取内容"""
+        """根据CSS类名提取内容，class_names可以是类名字符串或预编译的ClassQuery"""
         if not class_names:
             return ""
         
         # 处理多个类名（用空格或逗号分隔）
-        class_list = self._parse_class_names(class_names)
+        query = class_names if isinstance(class_names, ClassQuery) else class_query(class_names)
         
         # 尝试不同的选择器策略
         element = None
         
         # 策略1：精确匹配所有类名
-        if len(class_list) > 1:
-            selector = '.' + '.'.join(class_list)
-            element = soup.select_one(selector)
+        if query.selector:
+            element = soup.select_one(query.selector)
         
         # 策略2：单个类名匹配
         if not element:
-            for class_name in class_list:
+            for class_name in query.class_list:
                 element = soup.find(class_=class_name)
                 if element:
                     break
         
-        # 策略3：包含任意一个类名的元素
+        # 策略3：包含任意一个类名的元素，正则已预先编译
         if not element:
-            for class_name in class_list:
-                elements = soup.find_all(class_=re.compile(class_name))
-                if elements:
-                    element = elements[0]
+            for pattern in query.patterns:
+                element = soup.find(class_=pattern)
+                if element:
                     break
         
         if element:
             # 提取纯文本内容，去除HTML标签
             text = element.get_text(strip=True)
             # 清理多余的空白字符
-            text = re.sub(r'\s+', ' ', text)
+            text = _WHITESPACE.sub(' ', text)
             return text
         
         return ""
@@ -217,101 +364,30 @@ class HtmlExtractTool(Tool):
         """删除文本中的指定内容"""
         if not text or not delete_str:
             return text
-        
-        # 解析删除字符串
-        delete_targets = self._parse_replacement_strings(delete_str)
-        
-        # 执行删除
-        result_text = text
-        for target in delete_targets:
-            if target:
-                result_text = result_text.replace(target, "")
-        
-        return result_text
+        return compile_replacer(tuple((target, "") for target in parse_replacement_strings(delete_str))).apply(text)
     
     def _replace_content(self, text, target_str, replacement_str):
         """替换文本内容，支持多个目标和替换文本"""
         if not text or not target_str or not replacement_str:
             return text
         
-        # 解析目标字符串和替换字符串
-        targets = self._parse_replacement_strings(target_str)
-        replacements = self._parse_replacement_strings(replacement_str)
-        
-        # 确保目标和替换文本数量匹配
-        min_length = min(len(targets), len(replacements))
-        
-        # 执行替换
-        result_text = text
-        for i in range(min_length):
-            if targets[i] and replacements[i]:
-                result_text = result_text.replace(targets[i], replacements[i])
-        
-        return result_text
+        # 确保目标和替换文本数量匹配，多余的忽略
+        targets = parse_replacement_strings(target_str)
+        replacements = parse_replacement_strings(replacement_str)
+        return compile_replacer(tuple((target, new) for target, new in zip(targets, replacements) if new)).apply(text)
     
     def _parse_replacement_strings(self, input_str):
         """解析替换字符串，支持逗号和空格分隔"""
-        if not input_str:
-            return []
-        
-        # 先按逗号分割
-        if ',' in input_str:
-            # 如果包含逗号，按逗号分割
-            parts = input_str.split(',')
-            result = []
-            for part in parts:
-                part = part.strip()
-                if part:
-                    result.append(part)
-            return result
-        else:
-            # 如果不包含逗号，检查是否包含空格
-            input_str = input_str.strip()
-            if ' ' in input_str:
-                # 包含空格但没有逗号，可能是多个单词的短语或多个单独的词
-                # 为了支持英文短语，我们需要更智能的处理
-                # 如果用户想要分割多个词，应该使用逗号
-                # 这里我们将整个字符串作为一个删除目标
-                return [input_str]
-            else:
-                # 单个词，直接返回
-                return [input_str] if input_str else []
+        return parse_replacement_strings(input_str)
     
     def _parse_class_names(self, class_names):
         """解析类名字符串，支持空格和逗号分隔"""
-        # 先按逗号分割，再按空格分割
-        class_list = []
-        parts = class_names.replace(',', ' ').split()
-        for part in parts:
-            if part.strip():
-                class_list.append(part.strip())
-        return class_list
+        return parse_class_names(class_names)
     
     def _extract_meta_content(self, soup, meta_name):
         """从HTML meta标签中提取指定属性的内容"""
-        # 尝试不同的meta标签格式
-        meta_selectors = [
-            f'meta[name="{meta_name}"]',
-            f'meta[property="{meta_name}"]',
-            f'meta[name="{meta_name.lower()}"]',
-            f'meta[property="{meta_name.lower()}"]'
-        ]
-        
-        # 如果是description，还要尝试og:description
-        if meta_name.lower() == "description":
-            meta_selectors.extend([
-                'meta[property="og:description"]',
-                'meta[name="twitter:description"]'
-            ])
-        
-        # 如果是keywords，还要尝试其他可能的属性名
-        if meta_name.lower() == "keywords":
-            meta_selectors.extend([
-                'meta[name="keyword"]',
-                'meta[property="article:tag"]'
-            ])
-        
-        for selector in meta_selectors:
+        # 按优先级尝试不同的meta标签格式（选择器列表已缓存）
+        for selector in meta_selectors(meta_name):
             meta_tag = soup.select_one(selector)
             if meta_tag and meta_tag.get('content'):
                 content = meta_tag.get('content').strip()
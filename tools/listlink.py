@@ -1,27 +1,34 @@
+import contextvars
+from collections import deque
 from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin
+import logging
+import os
 import re
-import time
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
-try:
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
-    from selenium.webdriver.chrome.service import Service
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    from webdriver_manager.chrome import ChromeDriverManager
-    SELENIUM_AVAILABLE = True
-except ImportError:
-    SELENIUM_AVAILABLE = False
+from utils.browser import SELENIUM_AVAILABLE, get_browser_pool, wait_for_body
+from utils.charset import decode_html
+from utils.doccache import cached_link_document
+from utils.fetch import fetch
+from utils.metrics import count, count_nodes, instrumented, phase
+from utils.parser import element_key
+from utils.plan import ClassQuery, block_matcher, class_query, extract_tag_name, link_plan, parse_class_names
+from utils.readiness import wait_until_ready
+from utils.render import fetch_auto, render_once, resolve_render_mode
+from utils.seen import get_seen_store
+
+logger = logging.getLogger(__name__)
+
+# 按网址模板翻页时同时抓取的页数
+PAGE_CONCURRENCY = int(os.environ.get('XHB_PAGE_CONCURRENCY', '4'))
 
 class ListLinkTool(Tool):
+    @instrumented('listlink')
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         # 获取参数
         listurl = tool_parameters.get('listurl', '')
@@ -30,7 +37,14 @@ class ListLinkTool(Tool):
         aclass = tool_parameters.get('aclass', '')
         link = tool_parameters.get('link', '')
         blockurl = tool_parameters.get('blockurl', '')
-        use_browser = tool_parameters.get('use_browser', False)
+        render_mode = resolve_render_mode(tool_parameters.get('render_mode'), tool_parameters.get('use_browser', False))
+        wait_strategy = tool_parameters.get('wait_strategy', 'auto')
+        wait_timeout = tool_parameters.get('wait_timeout', 10)
+        cache_ttl = tool_parameters.get('cache_ttl')
+        next_page = tool_parameters.get('next_page', '')
+        page_template = tool_parameters.get('page_template', '')
+        max_pages = int(tool_parameters.get('max_pages') or 1)
+        feed_id = (tool_parameters.get('feed_id') or '').strip()
         
         if not listurl or not boxclass:
             yield self.create_json_message({
@@ -40,134 +54,261 @@ class ListLinkTool(Tool):
         
         try:
             # 根据参数选择获取HTML内容的方式
-            if use_browser:
-                if not SELENIUM_AVAILABLE:
-                    yield self.create_json_message({
-                        "error": "使用浏览器模式需要安装selenium库，请运行: pip install selenium"
-                    })
-                    return
-                html_content = self._get_html_content_with_browser(listurl)
-            else:
-                html_content = self._get_html_content(listurl)
-            
-            if not html_content:
+            if render_mode == 'browser' and not SELENIUM_AVAILABLE:
                 yield self.create_json_message({
-                    "error": "Failed to fetch HTML content from the URL"
+                    "error": "使用浏览器模式需要安装selenium库，请运行: pip install selenium"
                 })
                 return
+            fetch_page = self._make_page_fetcher(render_mode, boxclass, wait_strategy, wait_timeout, cache_ttl)
             
-            # 解析HTML
-            soup = BeautifulSoup(html_content, 'html.parser')
+            # 指定了来源标识时只返回以前没有返回过的链接
+            seen_store = get_seen_store() if feed_id else None
             
-            # 提取链接
-            links = self._extract_links(soup, boxclass, subclass, aclass, link, listurl, blockurl)
+            # 逐页提取链接，页与页之间增量去重
+            links = []
+            pages = 0
+            skipped = 0
+            page_iter = self._iter_pages(
+                listurl, fetch_page, boxclass, subclass, aclass, link, blockurl,
+                next_page, page_template, max_pages
+            )
+            for page_url, page_links in page_iter:
+                if page_links is None:
+                    count('errors')
+                    yield self.create_json_message({
+                        "error": "Failed to fetch HTML content from the URL"
+                    })
+                    return
+                pages += 1
+                if seen_store is not None and page_links:
+                    page_links, page_skipped = seen_store.filter_unseen(feed_id, page_links, mark=False)
+                    skipped += page_skipped
+                    if not page_links:
+                        # 整页都是以前返回过的链接，后面的页面上次也已经读过
+                        break
+                links.extend(page_links)
+            page_iter.close()
+            
+            # 成功输出前才记为已见，中途出错的链接下次仍会返回
+            if seen_store is not None:
+                seen_store.mark(feed_id, links)
             
             # 输出结果
-            yield self.create_json_message({
+            result = {
                 "links": links,
                 "count": len(links)
-            })
+            }
+            if max_pages > 1:
+                result["pages"] = pages
+            if seen_store is not None:
+                result["skipped"] = skipped
+            yield self.create_json_message(result)
             
         except Exception as e:
+            count('errors')
             yield self.create_json_message({
                 "error": f"An error occurred: {str(e)}"
             })
     
-    def _get_html_content(self, url):
-        """获取HTML内容，支持多种编码"""
+    def _make_page_fetcher(self, render_mode, boxclass, wait_strategy='auto', wait_timeout=10, cache_ttl=None):
+        """返回按获取方式（static、browser、auto）获取列表页HTML的函数，失败时返回None"""
+        ready_classes = self._parse_class_names(boxclass)
+        fetch_browser = lambda url: self._get_html_content_with_browser(url, ready_classes, wait_strategy, wait_timeout)
+        fetch_static = lambda url: self._get_html_content(url, cache_ttl)
+        if render_mode == 'browser':
+            return fetch_browser
+        if render_mode == 'auto':
+            # 先用普通模式，boxclass对应的元素不存在或为空时才升级到浏览器
+            return lambda url: fetch_auto(url, ready_classes, fetch_static, fetch_browser)
+        return fetch_static
+    
+    def _iter_pages(self, listurl, fetch_page, boxclass, subclass, aclass, link, blockurl,
+                    next_page='', page_template='', max_pages=1):
+        """按页产出(页面网址, 本页新发现的链接)
+        
+        第一页获取失败时产出(网址, None)。某一页没有新链接（全部已见过或没有链接）时提前停止。
+        """
+        seen_urls = set()
+        
+        def extract_page(html_content, page_url):
+            with phase('parse'):
+                soup = cached_link_document(html_content)
+            count_nodes(soup)
+            with phase('select'):
+                links = self._extract_links(soup, boxclass, subclass, aclass, link, page_url, blockurl, seen_urls)
+            count('pages')
+            return soup, links
+        
+        html_content = fetch_page(listurl)
+        if not html_content:
+            yield listurl, None
+            return
+        soup, links = extract_page(html_content, listurl)
+        # 生成器在产出期间会保留局部变量，解析完成后立即释放页面内容
+        html_content = None
+        yield listurl, links
+        
+        if max_pages <= 1 or not links:
+            return
+        if page_template:
+            yield from self._iter_template_pages(page_template, fetch_page, extract_page, max_pages)
+        elif next_page:
+            yield from self._iter_next_pages(soup, listurl, next_page, fetch_page, extract_page, max_pages)
+    
+    def _iter_template_pages(self, page_template, fetch_page, extract_page, max_pages):
+        """按网址模板翻页：页码可预测，用滑动窗口并发抓取，按页码顺序处理"""
+        page_urls = [page_template.replace('{page}', str(page)) for page in range(2, max_pages + 1)]
+        window = min(PAGE_CONCURRENCY, len(page_urls))
+        executor = ThreadPoolExecutor(max_workers=window, thread_name_prefix="listlink")
+        futures = deque()
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
+            for page_url in page_urls[:window]:
+                futures.append((page_url, executor.submit(contextvars.copy_context().run, fetch_page, page_url)))
+            next_index = window
             
-            # 尝试多种编码方式
-            encodings = ['utf-8', 'gb2312', 'gbk', 'latin1']
-            for encoding in encodings:
-                try:
-                    html_content = response.content.decode(encoding)
-                    return html_content
-                except UnicodeDecodeError:
-                    continue
+            while futures:
+                page_url, future = futures.popleft()
+                # 保持窗口内始终有页面在抓取
+                if next_index < len(page_urls):
+                    # 在当前上下文的副本中抓取，耗时计入本次调用
+                    futures.append((page_urls[next_index], executor.submit(
+                        contextvars.copy_context().run, fetch_page, page_urls[next_index]
+                    )))
+                    next_index += 1
+                
+                html_content = future.result()
+                if not html_content:
+                    break
+                _, links = extract_page(html_content, page_url)
+                html_content = None
+                yield page_url, links
+                if not links:
+                    break
+        finally:
+            # 提前停止时取消尚未开始的抓取
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _iter_next_pages(self, soup, page_url, next_page, fetch_page, extract_page, max_pages):
+        """按“下一页”链接翻页：下一页网址只有抓到当前页后才知道，只能依次抓取"""
+        visited = {page_url}
+        for _ in range(max_pages - 1):
+            next_url = self._find_next_page_url(soup, next_page, page_url)
+            if not next_url or next_url in visited:
+                break
+            visited.add(next_url)
+            
+            html_content = fetch_page(next_url)
+            if not html_content:
+                break
+            soup, links = extract_page(html_content, next_url)
+            html_content = None
+            page_url = next_url
+            yield page_url, links
+            if not links:
+                break
+    
+    def _find_next_page_url(self, soup, next_page, page_url):
+        """根据类名或CSS选择器查找下一页链接"""
+        selector = next_page.strip()
+        # 只填写类名时按类名查找
+        if re.fullmatch(r'[\w-]+', selector):
+            selector = '.' + selector
+        try:
+            elements = soup.select(selector)
+        except Exception:
+            return None
+        
+        for element in elements:
+            anchors = [element] if element.name == 'a' else element.find_all('a', href=True)
+            for anchor in anchors:
+                href = anchor.get('href')
+                if href and not self._should_block_url(href, ''):
+                    return urljoin(page_url, href)
+        return None
+    
+    def _get_html_content(self, url, cache_ttl=None):
+        """获取HTML内容，支持多种编码"""
+        try:
+            # 使用共享会话复用keep-alive连接
+            response = fetch(url, timeout=30, cache_ttl=cache_ttl)
             
-            # 如果所有编码都失败，使用默认的response.text
-            return response.text
+            # 按BOM、响应头、<meta charset>的顺序确定编码，只解码一次
+            with phase('decode'):
+                return decode_html(response.content, response.headers.get('Content-Type'))
             
-        except Exception as e:
+        except Exception:
             return None
     
-    def _get_html_content_with_browser(self, url):
+    def _get_html_content_with_browser(self, url, ready_classes=None, wait_strategy='auto', wait_timeout=10):
         """使用无头浏览器获取动态渲染的HTML内容"""
         if not SELENIUM_AVAILABLE:
             return None
         
-        driver = None
+        # 同时渲染同一网址的调用共享一次渲染，不重复占用浏览器
+        return render_once(
+            url, lambda: self._render_with_browser(url, ready_classes, wait_strategy, wait_timeout),
+            ready_classes, wait_strategy, wait_timeout
+        )
+    
+    def _render_with_browser(self, url, ready_classes=None, wait_strategy='auto', wait_timeout=10):
+        """从浏览器池租用WebDriver渲染页面，失败时返回None"""
         try:
-            # 配置Chrome选项
-            chrome_options = Options()
-            chrome_options.add_argument('--headless')  # 无头模式
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1920,1080')
-            chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-            
-            # 创建WebDriver实例（自动下载和管理ChromeDriver）
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=chrome_options)
-            driver.set_page_load_timeout(30)
-            
-            # 访问页面
-            driver.get(url)
-            
-            # 等待页面加载完成（等待body元素出现）
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            # 额外等待JavaScript执行
-            time.sleep(3)
-            
-            # 获取渲染后的HTML
-            html_content = driver.page_source
-            return html_content
+            # 从共享浏览器池租用已启动的WebDriver
+            with get_browser_pool().lease() as driver:
+                # 访问页面
+                with phase('navigate'):
+                    driver.get(url)
+                
+                # 等待页面加载完成（等待body元素出现）
+                with phase('body_wait'):
+                    wait_for_body(driver, 10)
+                
+                # 等待JavaScript渲染完成（优先等待目标类名的元素出现）
+                with phase('ready_wait'):
+                    wait_until_ready(driver, wait_strategy, ready_classes, timeout=wait_timeout)
+                
+                # 获取渲染后的HTML
+                count('renders')
+                html_content = driver.page_source
+                return html_content
             
         except Exception as e:
-            print(f"浏览器获取内容失败: {str(e)}")
+            logger.warning(f"浏览器获取内容失败: {str(e)}")
             return None
-        finally:
-            if driver:
-                driver.quit()
     
-    def _extract_links(self, soup, boxclass, subclass, aclass, base_url, original_url, blockurl=''):
-        """提取链接"""
+    def _extract_links(self, soup, boxclass, subclass, aclass, base_url, original_url, blockurl='', seen_urls=None):
+        """提取链接
+        
+        传入seen_urls时跨页增量去重：只返回集合中没有的链接，并把新链接加入集合。
+        """
         links = []
         
-        # 解析父类名
-        box_classes = self._parse_class_names(boxclass)
+        # 查找方式和屏蔽关键词匹配器按参数组合预先编译并跨调用缓存
+        plan = link_plan(boxclass, subclass, aclass, blockurl)
         
         # 查找父容器
-        parent_elements = self._find_elements_by_classes(soup, box_classes)
+        parent_elements = self._find_elements_by_classes(soup, plan.box)
         
         if not parent_elements:
             return links
         
+        base_prefix = base_url.rstrip('/') if base_url else ''
+        
+        # 已处理的a标签（按身份）和已输出的链接（保持顺序的集合）
+        seen_anchors = set()
+        if seen_urls is None:
+            seen_urls = set()
+        
         for parent_element in parent_elements:
-            if aclass:
+            if plan.anchor is not None:
                 # 如果指定了aclass，直接查找该类的a标签
-                a_classes = self._parse_class_names(aclass)
-                a_elements = self._find_elements_by_classes(parent_element, a_classes, tag='a')
-            elif subclass:
+                a_elements = self._find_elements_by_classes(parent_element, plan.anchor, tag='a')
+            elif plan.sub_tag_name or plan.sub is not None:
                 # 如果指定了subclass，先找子元素，再找其中的a标签
-                if self._is_html_tag(subclass):
-                    # 如果是HTML标签格式（如<li>、<span>等），直接按标签名查找
-                    tag_name = self._extract_tag_name(subclass)
-                    sub_elements = parent_element.find_all(tag_name)
+                if plan.sub_tag_name:
+                    sub_elements = parent_element.find_all(plan.sub_tag_name)
                 else:
-                    # 如果是CSS类名，按类名查找
-                    sub_classes = self._parse_class_names(subclass)
-                    sub_elements = self._find_elements_by_classes(parent_element, sub_classes)
+                    sub_elements = self._find_elements_by_classes(parent_element, plan.sub)
                 
                 a_elements = []
                 for sub_element in sub_elements:
@@ -178,111 +319,90 @@ class ListLinkTool(Tool):
             
             # 提取href并处理URL
             for a_element in a_elements:
+                anchor_key = element_key(a_element)
+                if anchor_key in seen_anchors:
+                    continue
+                seen_anchors.add(anchor_key)
+                
                 href = a_element.get('href')
                 if href:
                     # 处理相对链接
                     if base_url:
                         # 如果提供了base_url，使用它来拼接
                         if href.startswith('/'):
-                            full_url = base_url.rstrip('/') + href
+                            full_url = base_prefix + href
                         elif href.startswith('http'):
                             full_url = href
                         else:
-                            full_url = base_url.rstrip('/') + '/' + href
+                            full_url = base_prefix + '/' + href
                     else:
                         # 使用原始URL作为基础URL
                         full_url = urljoin(original_url, href)
                     
                     # 过滤链接
-                    if self._should_block_url(full_url, blockurl):
+                    if plan.is_blocked(full_url):
                         continue
                     
-                    if full_url not in links:
+                    if full_url not in seen_urls:
+                        seen_urls.add(full_url)
                         links.append(full_url)
         
         return links
     
     def _parse_class_names(self, class_names):
         """解析类名字符串，支持空格和逗号分隔"""
-        if not class_names:
-            return []
-        
-        # 先按逗号分割，再按空格分割
-        class_list = []
-        parts = class_names.replace(',', ' ').split()
-        for part in parts:
-            if part.strip():
-                class_list.append(part.strip())
-        return class_list
+        return parse_class_names(class_names)
     
     def _find_elements_by_classes(self, soup, class_list, tag=None):
-        """根据类名列表查找元素"""
+        """根据类名查找元素，class_list可以是类名列表或预编译的ClassQuery"""
+        query = class_list if isinstance(class_list, ClassQuery) else class_query(' '.join(class_list))
         elements = []
         
-        if not class_list:
+        if not query:
             return elements
         
         # 策略1：精确匹配所有类名
-        if len(class_list) > 1:
-            selector = '.' + '.'.join(class_list)
-            if tag:
-                selector = tag + selector
-            found_elements = soup.select(selector)
+        if query.selector:
+            found_elements = soup.select(query.tag_selector(tag))
             elements.extend(found_elements)
         
         # 策略2：单个类名匹配
         if not elements:
-            for class_name in class_list:
+            for class_name in query.class_list:
                 if tag:
                     found_elements = soup.find_all(tag, class_=class_name)
                 else:
                     found_elements = soup.find_all(class_=class_name)
                 elements.extend(found_elements)
         
-        # 策略3：包含任意一个类名的元素（模糊匹配）
+        # 策略3：包含任意一个类名的元素（模糊匹配），正则已预先编译
         if not elements:
-            for class_name in class_list:
+            for pattern in query.patterns:
                 if tag:
-                    found_elements = soup.find_all(tag, class_=re.compile(class_name))
+                    found_elements = soup.find_all(tag, class_=pattern)
                 else:
-                    found_elements = soup.find_all(class_=re.compile(class_name))
+                    found_elements = soup.find_all(class_=pattern)
                 elements.extend(found_elements)
         
-        # 去重
+        # 按身份去重，保持原有顺序
         unique_elements = []
+        seen = set()
         for element in elements:
-            if element not in unique_elements:
+            key = element_key(element)
+            if key not in seen:
+                seen.add(key)
                 unique_elements.append(element)
         
         return unique_elements
     
     def _is_html_tag(self, text):
         """判断输入是否为HTML标签格式（如<li>、<span>等）"""
-        import re
-        return bool(re.match(r'^<[a-zA-Z][a-zA-Z0-9]*>$', text.strip()))
+        return extract_tag_name(text) is not None
     
     def _extract_tag_name(self, tag_text):
         """从HTML标签格式中提取标签名（如从<li>提取li）"""
-        import re
-        match = re.match(r'^<([a-zA-Z][a-zA-Z0-9]*)>$', tag_text.strip())
-        return match.group(1) if match else None
+        return extract_tag_name(tag_text)
     
     def _should_block_url(self, url, blockurl):
         """判断链接是否应该被屏蔽"""
-        # 自动屏蔽空链接和javascript链接
-        if not url or url.strip() == '' or url.strip() == '#' or url.lower().startswith('javascript:'):
-            return True
-        
-        # 如果没有设置屏蔽关键词，则不屏蔽
-        if not blockurl or not blockurl.strip():
-            return False
-        
-        # 解析屏蔽关键词
-        block_keywords = self._parse_class_names(blockurl)
-        
-        # 检查URL是否包含任一屏蔽关键词
-        for keyword in block_keywords:
-            if keyword and keyword.strip() and keyword.strip().lower() in url.lower():
-                return True
-        
-        return False
+        return block_matcher(blockurl or '')(url)
@@ -0,0 +1,119 @@
+from collections.abc import Generator
+from itertools import chain
+from typing import Any
+
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+# 以模块方式导入：SDK要求每个工具模块中只有一个Tool子类
+import tools.htmlextract as htmlextract
+import tools.listlink as listlink
+from utils.browser import SELENIUM_AVAILABLE
+from utils.metrics import count, instrumented
+from utils.render import resolve_render_mode
+
+class NewsCrawlTool(Tool):
+    @instrumented('newscrawl')
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        # 获取列表页参数
+        listurl = tool_parameters.get('listurl', '')
+        boxclass = tool_parameters.get('boxclass', '')
+        subclass = tool_parameters.get('subclass', '')
+        aclass = tool_parameters.get('aclass', '')
+        link = tool_parameters.get('link', '')
+        blockurl = tool_parameters.get('blockurl', '')
+        # 获取文章页参数
+        news_title_class = tool_parameters.get("news-title", "")
+        news_content_class = tool_parameters.get("news-content", "")
+        # 获取通用参数
+        render_mode = resolve_render_mode(tool_parameters.get('render_mode'), tool_parameters.get('use_browser', False))
+        wait_strategy = tool_parameters.get('wait_strategy', 'auto')
+        wait_timeout = tool_parameters.get('wait_timeout', 10)
+        cache_ttl = tool_parameters.get('cache_ttl')
+        concurrency = tool_parameters.get('concurrency') or htmlextract.BATCH_CONCURRENCY
+        max_articles = int(tool_parameters.get('max_articles') or 0)
+        next_page = tool_parameters.get('next_page', '')
+        page_template = tool_parameters.get('page_template', '')
+        max_pages = int(tool_parameters.get('max_pages') or 1)
+
+        if not listurl or not boxclass:
+            yield self.create_json_message({
+                "error": "listurl and boxclass are required parameters"
+            })
+            return
+
+        if not news_title_class or not news_content_class:
+            yield self.create_json_message({
+                "error": "请提供标题和内容的CSS类名"
+            })
+            return
+
+        if render_mode == 'browser' and not SELENIUM_AVAILABLE:
+            yield self.create_json_message({
+                "error": "使用浏览器模式需要安装selenium库，请运行: pip install selenium"
+            })
+            return
+
+        # 复用两个工具的抓取和提取逻辑，共享同一个HTTP会话和浏览器池
+        lister = listlink.ListLinkTool(self.runtime, self.session)
+        extractor = htmlextract.HtmlExtractTool(self.runtime, self.session)
+
+        try:
+            # 抓取列表页（可翻页），第一页失败时直接报错
+            fetch_page = lister._make_page_fetcher(render_mode, boxclass, wait_strategy, wait_timeout, cache_ttl)
+            pages = lister._iter_pages(
+                listurl, fetch_page, boxclass, subclass, aclass, link, blockurl,
+                next_page, page_template, max_pages
+            )
+            _, first_links = next(pages)
+            if first_links is None:
+                count('errors')
+                yield self.create_json_message({
+                    "error": "Failed to fetch HTML content from the URL"
+                })
+                return
+
+            options = {
+                "title_class": news_title_class,
+                "content_class": news_content_class,
+                "tag_class": tool_parameters.get("news-tag", ""),
+                "source_class": tool_parameters.get("news-source", ""),
+                "content_target": tool_parameters.get("content-target", ""),
+                "content_text": tool_parameters.get("content-text", ""),
+                "deletecontent": tool_parameters.get("deletecontent", ""),
+                "render_mode": render_mode,
+                "wait_strategy": wait_strategy,
+                "wait_timeout": wait_timeout,
+                "cache_ttl": cache_ttl,
+            }
+
+            # 发现的链接（包括后续页面上的）直接进入并发提取，每完成一篇立即输出
+            links = []
+
+            def discovered_links():
+                for page_links in chain([first_links], (page_links for _, page_links in pages)):
+                    for url in page_links:
+                        if max_articles and len(links) >= max_articles:
+                            return
+                        links.append(url)
+                        yield url
+
+            records = {}
+            for index, record in extractor._iter_articles(discovered_links(), options, concurrency):
+                records[index] = record
+                yield self.create_json_message(record)
+            # 达到最大文章数后不再翻页
+            pages.close()
+            results = [records[index] for index in range(len(links))]
+
+            failed = sum(1 for record in results if record["error"])
+            yield self.create_variable_message("links", links)
+            yield self.create_variable_message("results", results)
+            yield self.create_variable_message("count", len(results) - failed)
+            yield self.create_variable_message("failed", failed)
+
+        except Exception as e:
+            count('errors')
+            yield self.create_json_message({
+                "error": f"An error occurred: {str(e)}"
+            })
@@ -4,8 +4,47 @@ from typing import Any
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
+from utils.browser import browser_pool_stats
+from utils.cache import get_response_cache
+from utils.doccache import get_document_cache
+from utils.engine import get_engine
+from utils.metrics import get_metrics
+from utils.plan import plan_cache_info
+from utils.render import get_render_memory
+from utils.singleflight import flight_stats
+
+SECTIONS = ('all', 'tools', 'fetch', 'browser', 'plans', 'documents')
+
 class XhbtoolTool(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
-        yield self.create_json_message({
-            "result": "Hello, world!"
-        })
+        """输出插件进程的运行统计：各工具的耗时直方图和计数，以及抓取、缓存、浏览器等共享组件的状态"""
+        section = tool_parameters.get('section') or 'all'
+        if section not in SECTIONS:
+            section = 'all'
+        
+        stats = {}
+        if section in ('all', 'tools'):
+            # 各工具每次调用的总耗时和各阶段耗时（毫秒）直方图，以及调用数、下载字节数等计数
+            stats['tools'] = get_metrics().snapshot()
+        if section in ('all', 'fetch'):
+            stats['fetch'] = {
+                'hosts': get_engine().stats(),
+                'response_cache': get_response_cache().stats(),
+                'single_flight': flight_stats(),
+            }
+        if section in ('all', 'browser'):
+            stats['browser'] = {
+                'pool': browser_pool_stats(),
+                'render_memory': get_render_memory().stats(),
+            }
+        if section in ('all', 'plans'):
+            stats['plans'] = plan_cache_info()
+        if section in ('all', 'documents'):
+            # 已解析文档缓存的命中率、淘汰次数和估算内存
+            stats['documents'] = get_document_cache().stats()
+        
+        # 读取后清空耗时统计，下次只统计之后的调用（共享组件的状态不受影响）
+        if tool_parameters.get('reset'):
+            get_metrics().reset()
+        
+        yield self.create_json_message(stats)
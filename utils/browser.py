@@ -0,0 +1,467 @@
+import atexit
+import importlib.util
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from utils.metrics import count, phase
+
+logger = logging.getLogger(__name__)
+
+# 只检查selenium是否已安装，真正的导入推迟到第一次使用浏览器时
+SELENIUM_AVAILABLE = importlib.util.find_spec('selenium') is not None
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# 浏览器池配置（可通过环境变量调整）
+POOL_SIZE = int(os.environ.get('XHB_BROWSER_POOL_SIZE', '2'))
+POOL_MAX_USES = int(os.environ.get('XHB_BROWSER_MAX_USES', '50'))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get('XHB_BROWSER_ACQUIRE_TIMEOUT', '60'))
+POOL_PREWARM = int(os.environ.get('XHB_BROWSER_PREWARM', '1'))
+PAGE_LOAD_TIMEOUT = 30
+
+# 渲染配置：light只加载渲染DOM所需的资源，full与原来一样加载全部资源
+RENDER_PROFILE = os.environ.get('XHB_BROWSER_PROFILE', 'light')
+# light配置下屏蔽的资源类别（逗号分隔）和额外屏蔽的URL模式（逗号分隔，支持*通配符）
+BLOCK_RESOURCES = os.environ.get('XHB_BROWSER_BLOCK', 'image,font,media,stylesheet,tracker')
+BLOCK_PATTERNS = os.environ.get('XHB_BROWSER_BLOCK_PATTERNS', '')
+# light配置下setInterval的最小间隔（毫秒），避免轮播、动画等高频定时器持续占用CPU
+MIN_TIMER_INTERVAL = int(os.environ.get('XHB_BROWSER_MIN_TIMER_MS', '200'))
+LIGHT_WINDOW_SIZE = '1366,768'
+
+# 各类资源对应的URL模式（Network.setBlockedURLs只能按URL匹配，按扩展名区分资源类型）
+_RESOURCE_PATTERNS = {
+    'image': ('png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'bmp', 'ico', 'svg'),
+    'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'media': ('mp4', 'webm', 'mp3', 'm4a', 'ogg', 'wav', 'flv', 'm3u8', 'ts'),
+    'stylesheet': ('css',),
+}
+# 常见统计、广告和社交分享脚本
+_TRACKER_PATTERNS = (
+    '*google-analytics.com/*', '*googletagmanager.com/*', '*doubleclick.net/*',
+    '*googlesyndication.com/*', '*facebook.net/*', '*connect.facebook.com/*',
+    '*hm.baidu.com/*', '*cpro.baidustatic.com/*', '*pos.baidu.com/*', '*zz.bdstatic.com/*',
+    '*cnzz.com/*', '*51.la/*', '*umeng.com/*', '*growingio.com/*', '*sensorsdata.cn/*',
+    '*scorecardresearch.com/*', '*bshare.cn/*', '*jiathis.com/*',
+)
+
+# 在每个页面的脚本执行前注入：限制setInterval的最小间隔
+_TIMER_LIMIT_JS = """
+(function () {
+    var minDelay = %d;
+    var original = window.setInterval;
+    window.setInterval = function (handler, delay) {
+        var args = Array.prototype.slice.call(arguments);
+        args[1] = Math.max(Number(delay) || 0, minDelay);
+        return original.apply(this, args);
+    };
+})();
+"""
+
+# ChromeDriver路径缓存文件，解析一次后离线复用
+DRIVER_CACHE_FILE = os.environ.get(
+    'XHB_DRIVER_CACHE_FILE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'xhbtool', 'chromedriver.json'),
+)
+
+_selenium = None
+_selenium_lock = threading.Lock()
+_driver_path = None
+_driver_path_installed = False  # _driver_path是否本进程刚通过webdriver_manager获取
+_driver_path_lock = threading.Lock()
+
+
+def load_selenium():
+    """首次使用浏览器时才导入selenium，之后复用已导入的模块"""
+    global _selenium
+    if _selenium is None:
+        with _selenium_lock:
+            if _selenium is None:
+                from selenium import webdriver
+                from selenium.webdriver.chrome.options import Options
+                from selenium.webdriver.chrome.service import Service
+                from selenium.webdriver.common.by import By
+                from selenium.webdriver.support.ui import WebDriverWait
+                from selenium.webdriver.support import expected_conditions as EC
+                _selenium = {
+                    'webdriver': webdriver,
+                    'Options': Options,
+                    'Service': Service,
+                    'By': By,
+                    'WebDriverWait': WebDriverWait,
+                    'EC': EC,
+                }
+    return _selenium
+
+
+def resolve_driver_path():
+    """解析ChromeDriver路径
+
+    优先使用环境变量XHB_CHROMEDRIVER，其次是本地缓存文件中记录的路径，
+    都不可用时才调用webdriver_manager下载/查找，并把结果写回缓存文件。
+    """
+    global _driver_path, _driver_path_installed
+    if _driver_path and os.path.isfile(_driver_path):
+        return _driver_path
+    with _driver_path_lock:
+        if _driver_path and os.path.isfile(_driver_path):
+            return _driver_path
+        path = os.environ.get('XHB_CHROMEDRIVER') or _read_driver_cache()
+        _driver_path_installed = not path
+        if not path:
+            path = _install_driver()
+            _write_driver_cache(path)
+        _driver_path = path
+    return _driver_path
+
+
+def refresh_driver_path(stale_path):
+    """stale_path启动失败（如Chrome升级后缓存的驱动版本不匹配）时，删除缓存文件并重新下载/查找
+
+    返回新的路径；其它线程已经换掉stale_path时直接返回当前路径，不重复下载。
+    stale_path本身就是刚下载的驱动时返回None，重新下载也无济于事。
+    """
+    global _driver_path, _driver_path_installed
+    with _driver_path_lock:
+        if _driver_path and _driver_path != stale_path:
+            return _driver_path
+        if _driver_path_installed:
+            return None
+        _driver_path = None
+        _remove_driver_cache()
+        path = _install_driver()
+        _write_driver_cache(path)
+        _driver_path = path
+        _driver_path_installed = True
+    return path
+
+
+def _install_driver():
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+
+def _read_driver_cache():
+    try:
+        with open(DRIVER_CACHE_FILE, 'r', encoding='utf-8') as f:
+            path = json.load(f).get('path')
+        if path and os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def _write_driver_cache(path):
+    try:
+        os.makedirs(os.path.dirname(DRIVER_CACHE_FILE), exist_ok=True)
+        tmp_file = DRIVER_CACHE_FILE + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'path': path}, f)
+        os.replace(tmp_file, DRIVER_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"写入ChromeDriver缓存失败: {str(e)}")
+
+
+def _remove_driver_cache():
+    try:
+        os.remove(DRIVER_CACHE_FILE)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除ChromeDriver缓存失败: {str(e)}")
+
+
+def blocked_url_patterns(resources=None, extra_patterns=None):
+    """light配置下屏蔽的URL模式列表"""
+    resources = BLOCK_RESOURCES if resources is None else resources
+    extra_patterns = BLOCK_PATTERNS if extra_patterns is None else extra_patterns
+    patterns = []
+    for resource in (part.strip().lower() for part in resources.split(',')):
+        if resource == 'tracker':
+            patterns.extend(_TRACKER_PATTERNS)
+        for extension in _RESOURCE_PATTERNS.get(resource, ()):
+            # 同时匹配带查询参数的地址（如style.css?v=3）
+            patterns.extend((f'*.{extension}', f'*.{extension}?*'))
+    patterns.extend(part.strip() for part in extra_patterns.split(',') if part.strip())
+    return patterns
+
+
+def build_chrome_options(profile=None):
+    """构建三个工具共用的Chrome选项"""
+    light = (profile or RENDER_PROFILE) == 'light'
+    chrome_options = load_selenium()['Options']()
+    chrome_options.add_argument('--headless')  # 无头模式
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    if light:
+        # 只读取DOM：较小的视口、不解码图片、不自动播放媒体
+        chrome_options.add_argument(f'--window-size={LIGHT_WINDOW_SIZE}')
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        chrome_options.add_argument('--mute-audio')
+        chrome_options.add_argument('--autoplay-policy=user-gesture-required')
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+        })
+    else:
+        chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument(f'--user-agent={USER_AGENT}')
+    # 禁用Google API服务，避免GCM错误
+    chrome_options.add_argument('--disable-features=GCMChannelStatus')
+    chrome_options.add_argument('--disable-notifications')
+    chrome_options.add_argument('--disable-background-networking')
+    chrome_options.add_argument('--disable-sync')
+    chrome_options.add_argument('--disable-default-apps')
+    chrome_options.add_argument('--disable-extensions')
+    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])  # 禁用日志输出
+    return chrome_options
+
+
+def create_driver(profile=None):
+    """启动一个新的无头Chrome实例"""
+    profile = profile or RENDER_PROFILE
+    selenium = load_selenium()
+    options = build_chrome_options(profile)
+    path = resolve_driver_path()
+    try:
+        driver = selenium['webdriver'].Chrome(service=selenium['Service'](path), options=options)
+    except Exception as e:
+        # 缓存或XHB_CHROMEDRIVER指定的驱动可能已与Chrome版本不匹配：重新获取一次驱动后重试
+        try:
+            fresh_path = refresh_driver_path(path)
+        except Exception as refresh_error:
+            logger.warning(f"重新获取ChromeDriver失败: {str(refresh_error)}")
+            fresh_path = None
+        if fresh_path is None or fresh_path == path:
+            raise e
+        logger.warning(f"ChromeDriver启动失败，已改用重新获取的驱动: {str(e)}")
+        driver = selenium['webdriver'].Chrome(service=selenium['Service'](fresh_path), options=options)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    if profile == 'light':
+        apply_light_profile(driver)
+    return driver
+
+
+def apply_light_profile(driver):
+    """通过DevTools协议屏蔽不需要的资源请求并限制定时器
+
+    设置作用于浏览器实例的当前标签页，归还浏览器池后仍然有效。
+    屏蔽规则设置失败（如旧版Chrome不支持）时退回到只禁用图片。
+    """
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_url_patterns()})
+    except Exception as e:
+        logger.warning(f"设置资源屏蔽规则失败: {str(e)}")
+    if MIN_TIMER_INTERVAL > 0:
+        try:
+            driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+                'source': _TIMER_LIMIT_JS % MIN_TIMER_INTERVAL,
+            })
+        except Exception as e:
+            logger.warning(f"设置定时器限制失败: {str(e)}")
+
+
+def wait_for_body(driver, timeout=10):
+    """等待页面body元素出现"""
+    selenium = load_selenium()
+    selenium['WebDriverWait'](driver, timeout).until(
+        selenium['EC'].presence_of_element_located((selenium['By'].TAG_NAME, "body"))
+    )
+
+
+class _PooledDriver:
+    """池中的一个浏览器实例及其使用计数"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+
+class BrowserPool:
+    """进程级无头浏览器池
+
+    预先启动若干Chrome实例并在调用之间复用。每次归还时清理cookie和存储，
+    使用次数达到上限或实例崩溃时自动回收重建；池满时调用方阻塞等待。
+    """
+
+    def __init__(self, size=POOL_SIZE, max_uses=POOL_MAX_USES, acquire_timeout=POOL_ACQUIRE_TIMEOUT):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.acquire_timeout = acquire_timeout
+        self._idle = []
+        self._total = 0
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        # 预热进行中时，没有空闲实例的调用方等待预热完成，而不是再启动一个
+        self._ready = threading.Condition(self._lock)
+        self._warming = False
+        self._closed = False
+
+    def warm_in_background(self, count=None):
+        """在后台线程中预热；返回前即标记预热进行中，随后的acquire会等待预热的实例"""
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+        threading.Thread(target=self.warm, args=(count,), daemon=True).start()
+
+    def warm(self, count=None):
+        """预先启动浏览器实例，放入空闲队列"""
+        count = self.size if count is None else min(count, self.size)
+        with self._lock:
+            self._warming = True
+        try:
+            for _ in range(count):
+                if not self._slots.acquire(blocking=False):
+                    break
+                try:
+                    with self._lock:
+                        if len(self._idle) >= count or self._total >= self.size:
+                            break
+                    pooled = self._spawn()
+                    with self._lock:
+                        self._idle.append(pooled)
+                        self._ready.notify()
+                except Exception as e:
+                    logger.warning(f"浏览器预热失败: {str(e)}")
+                    break
+                finally:
+                    self._slots.release()
+        finally:
+            with self._lock:
+                self._warming = False
+                self._ready.notify_all()
+
+    def acquire(self, timeout=None):
+        """租用一个浏览器实例，池满时阻塞等待"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        if self._closed:
+            raise RuntimeError("浏览器池已关闭")
+        with phase('browser_wait'):
+            acquired = self._slots.acquire(timeout=timeout)
+            if acquired:
+                with self._lock:
+                    # 预热中的实例马上可用，等待它比自己再冷启动一个Chrome更快
+                    self._ready.wait_for(lambda: self._idle or not self._warming, timeout=timeout)
+        if not acquired:
+            raise TimeoutError(f"等待空闲浏览器超时（{timeout}秒）")
+        try:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                pooled = self._spawn()
+            pooled.uses += 1
+            return pooled
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, pooled, broken=False):
+        """归还浏览器实例，清理会话或回收"""
+        try:
+            if (broken or self._closed or pooled.uses >= self.max_uses
+                    or self._total > self.size or not self._reset_session(pooled.driver)):
+                self._quit(pooled.driver)
+            else:
+                with self._lock:
+                    self._idle.append(pooled)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """以上下文管理器的方式租用浏览器"""
+        pooled = self.acquire(timeout)
+        broken = False
+        try:
+            yield pooled.driver
+        except Exception:
+            # 出错后检查实例是否仍然存活，崩溃的实例直接回收
+            broken = not self._is_alive(pooled.driver)
+            raise
+        finally:
+            self.release(pooled, broken=broken)
+
+    def close(self):
+        """关闭池中所有空闲浏览器"""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._quit(pooled.driver)
+
+    def stats(self):
+        """池大小、已启动和空闲的实例数"""
+        with self._lock:
+            return {'size': self.size, 'total': self._total, 'idle': len(self._idle)}
+
+    def _spawn(self):
+        with phase('browser_start'):
+            pooled = _PooledDriver(create_driver())
+        count('browser_starts')
+        with self._lock:
+            self._total += 1
+        return pooled
+
+    def _reset_session(self, driver):
+        """清理cookie、本地存储并关闭多余窗口，返回实例是否可继续使用"""
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            parsed = urlparse(driver.current_url)
+            if parsed.scheme in ('http', 'https'):
+                driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+                    'origin': f'{parsed.scheme}://{parsed.netloc}',
+                    'storageTypes': 'all',
+                })
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            driver.delete_all_cookies()
+            driver.get('about:blank')
+            return True
+        except Exception:
+            return False
+
+    def _is_alive(self, driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        with self._lock:
+            self._total -= 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """获取进程级共享浏览器池，首次调用时创建并在后台预热"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool()
+                atexit.register(_pool.close)
+                if POOL_PREWARM > 0:
+                    _pool.warm_in_background(POOL_PREWARM)
+    return _pool
+
+
+def browser_pool_stats():
+    """浏览器池的状态，尚未创建时返回None（不会因此启动浏览器）"""
+    return _pool.stats() if _pool is not None else None
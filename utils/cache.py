@@ -0,0 +1,272 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# 响应缓存配置（可通过环境变量调整）
+MEMORY_MAX_BYTES = int(os.environ.get('XHB_HTTP_CACHE_MEMORY_BYTES', str(16 * 1024 * 1024)))
+DISK_MAX_BYTES = int(os.environ.get('XHB_HTTP_CACHE_DISK_BYTES', str(64 * 1024 * 1024)))
+CACHE_DIR = os.environ.get(
+    'XHB_HTTP_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'xhbtool', 'http'),
+)
+
+# 缓存中保留的响应头
+KEPT_HEADERS = ('content-type', 'etag', 'last-modified', 'cache-control', 'expires', 'date')
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """规范化URL作为缓存键：小写协议和主机、去掉默认端口和片段、排序查询参数"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+    if parts.username:
+        userinfo = parts.username + (f':{parts.password}' if parts.password else '')
+        host = f'{userinfo}@{host}'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+def parse_cache_control(value):
+    """解析Cache-Control头，返回指令字典"""
+    directives = {}
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, arg = item.partition('=')
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else True
+    return directives
+
+
+class CacheEntry:
+    """一条缓存的响应"""
+
+    def __init__(self, url, body, headers, stored_at, expires_at):
+        self.url = url
+        self.body = body
+        self.headers = headers
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+
+    @property
+    def size(self):
+        return len(self.body)
+
+    def is_fresh(self, now=None):
+        return (now or time.time()) < self.expires_at
+
+    def validators(self):
+        """返回用于条件请求的请求头"""
+        headers = {}
+        if self.headers.get('etag'):
+            headers['If-None-Match'] = self.headers['etag']
+        if self.headers.get('last-modified'):
+            headers['If-Modified-Since'] = self.headers['last-modified']
+        return headers
+
+    def to_meta(self):
+        return {
+            'url': self.url,
+            'headers': self.headers,
+            'stored_at': self.stored_at,
+            'expires_at': self.expires_at,
+        }
+
+
+def freshness_lifetime(headers, ttl=None):
+    """计算响应的新鲜期（秒），返回None表示不可缓存
+
+    ttl不为None时覆盖响应头中的新鲜期，但仍然遵守no-store。
+    """
+    directives = parse_cache_control(headers.get('cache-control'))
+    if 'no-store' in directives:
+        return None
+    if ttl is not None:
+        return max(0, ttl)
+    if 'no-cache' in directives:
+        return 0
+    if 'max-age' in directives:
+        try:
+            return max(0, int(directives['max-age']))
+        except (TypeError, ValueError):
+            return 0
+    if headers.get('expires'):
+        try:
+            expires = parsedate_to_datetime(headers['expires']).timestamp()
+            return max(0, expires - time.time())
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+class ResponseCache:
+    """按字节数限制大小的两级响应缓存（内存LRU + 磁盘）"""
+
+    def __init__(self, memory_max_bytes=MEMORY_MAX_BYTES, disk_max_bytes=DISK_MAX_BYTES, cache_dir=CACHE_DIR):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.cache_dir = cache_dir
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_index = None
+        self._disk_bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'coalesced': 0, 'stores': 0, 'evictions': 0}
+
+    # 内存部分（get_memory、put_memory）可以在事件循环中直接调用；
+    # 磁盘部分（load、persist）会阻塞，需放到线程中执行
+
+    def get_memory(self, key):
+        """只读取内存中的缓存条目"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def load(self, key):
+        """从磁盘读取缓存条目并放入内存"""
+        entry = self._read_disk(key)
+        if entry is not None:
+            with self._lock:
+                self._put_memory(key, entry)
+        return entry
+
+    def put_memory(self, key, entry):
+        with self._lock:
+            self._stats['stores'] += 1
+            self._put_memory(key, entry)
+
+    def persist(self, key, entry):
+        """把缓存条目写入磁盘"""
+        self._write_disk(key, entry)
+
+    def record(self, outcome):
+        """记录一次缓存结果：hits / misses / revalidated / coalesced（合并到进行中的下载）"""
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_bytes'] = self._memory_bytes
+            stats['memory_entries'] = len(self._memory)
+            stats['disk_bytes'] = self._disk_bytes
+            return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            index = self._load_disk_index()
+            for name in list(index):
+                self._remove_disk(name, hashed=True)
+
+    def _put_memory(self, key, entry):
+        if entry.size > self.memory_max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old.size
+        self._memory[key] = entry
+        self._memory_bytes += entry.size
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.size
+            self._stats['evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def _load_disk_index(self):
+        """首次访问磁盘缓存时扫描目录，按修改时间建立索引"""
+        if self._disk_index is None:
+            self._disk_index = OrderedDict()
+            self._disk_bytes = 0
+            if self.disk_max_bytes > 0 and os.path.isdir(self.cache_dir):
+                files = []
+                for item in os.scandir(self.cache_dir):
+                    if item.is_file() and not item.name.endswith('.tmp'):
+                        stat = item.stat()
+                        files.append((stat.st_mtime, item.name, stat.st_size))
+                for _, name, size in sorted(files):
+                    self._disk_index[name] = size
+                    self._disk_bytes += size
+        return self._disk_index
+
+    def _read_disk(self, key):
+        if self.disk_max_bytes <= 0:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline().decode('utf-8'))
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            index = self._load_disk_index()
+            name = os.path.basename(path)
+            if name in index:
+                index.move_to_end(name)
+        return CacheEntry(meta['url'], body, meta['headers'], meta['stored_at'], meta['expires_at'])
+
+    def _write_disk(self, key, entry):
+        if self.disk_max_bytes <= 0 or entry.size > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        name = os.path.basename(path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps(entry.to_meta()).encode('utf-8') + b'\n')
+                f.write(entry.body)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入磁盘缓存失败: {str(e)}")
+            return
+        with self._lock:
+            index = self._load_disk_index()
+            self._disk_bytes -= index.pop(name, 0)
+            index[name] = size
+            self._disk_bytes += size
+            while self._disk_bytes > self.disk_max_bytes and index:
+                oldest = next(iter(index))
+                self._remove_disk(oldest, hashed=True)
+                self._stats['evictions'] += 1
+
+    def _remove_disk(self, key, hashed=False):
+        name = key if hashed else os.path.basename(self._disk_path(key))
+        self._disk_bytes -= self._disk_index.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """获取进程级共享的响应缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
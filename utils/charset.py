@@ -0,0 +1,117 @@
+import codecs
+import re
+
+try:
+    from charset_normalizer import from_bytes as _normalizer_from_bytes
+except ImportError:
+    _normalizer_from_bytes = None
+
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+# 只在前几KB中查找<meta charset>
+META_SNIFF_BYTES = 4096
+# 统计检测只取开头一段样本
+DETECT_SAMPLE_BYTES = 64 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+_HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+# GB2312/GBK都是GB18030的子集，统一用GB18030解码，避免生僻字解码失败
+_ALIASES = {
+    'gb2312': 'gb18030',
+    'gbk': 'gb18030',
+    'x-gbk': 'gb18030',
+    'cp936': 'gb18030',
+    'utf8': 'utf-8',
+    'ascii': 'utf-8',
+    'us-ascii': 'utf-8',
+}
+
+
+def normalize_encoding(name):
+    """规范化编码名称，无法识别时返回None"""
+    if not name:
+        return None
+    name = name.strip().lower()
+    name = _ALIASES.get(name, name)
+    try:
+        codecs.lookup(name)
+    except LookupError:
+        return None
+    return name
+
+
+def detect_encoding(body, content_type=None):
+    """按 BOM → HTTP头 → <meta charset> → 统计检测 的顺序确定编码"""
+    for bom, encoding in _BOMS:
+        if body.startswith(bom):
+            return encoding
+
+    if content_type:
+        match = _HEADER_CHARSET_RE.search(content_type)
+        if match:
+            encoding = normalize_encoding(match.group(1))
+            if encoding:
+                return encoding
+
+    match = _META_CHARSET_RE.search(body[:META_SNIFF_BYTES])
+    if match:
+        encoding = normalize_encoding(match.group(1).decode('ascii', 'ignore'))
+        if encoding:
+            return encoding
+
+    return guess_encoding(body)
+
+
+def guess_encoding(body):
+    """统计检测编码，没有可用的检测库时按UTF-8、GB18030的顺序尝试"""
+    sample = body[:DETECT_SAMPLE_BYTES]
+    if _normalizer_from_bytes is not None:
+        best = _normalizer_from_bytes(sample).best()
+        if best is not None:
+            return normalize_encoding(best.encoding) or 'utf-8'
+    elif chardet is not None:
+        encoding = normalize_encoding(chardet.detect(sample).get('encoding'))
+        if encoding:
+            return encoding
+
+    for encoding in ('utf-8', 'gb18030'):
+        try:
+            # 使用增量解码器，样本末尾被截断的多字节字符不算错误
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'latin1'
+
+
+def decode_html(body, content_type=None):
+    """一次性把响应体解码成文本
+
+    声明的编码与实际内容不符（严格解码失败）时，改用统计检测的编码，
+    最终以replace方式解码，保证总能返回文本。
+    """
+    if not body:
+        return ''
+    encoding = detect_encoding(body, content_type)
+    try:
+        return body.decode(encoding)
+    except UnicodeDecodeError:
+        fallback = guess_encoding(body)
+        if fallback != encoding:
+            try:
+                return body.decode(fallback)
+            except UnicodeDecodeError:
+                encoding = fallback
+        return body.decode(encoding, errors='replace')
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from utils.metrics import count
+from utils.parser import LINK_PARSER, LexborNode, make_link_document, make_partial_soup, make_soup, resolve_parser
+
+# 已解析文档缓存的内存上限（按估算的解析树大小，字节；0表示不缓存）
+DOCUMENT_CACHE_BYTES = int(os.environ.get('XHB_DOC_CACHE_BYTES', str(64 * 1024 * 1024)))
+# 解析树内存估算：BeautifulSoup每个节点约700字节，lexbor文档约为HTML字符数的20倍
+SOUP_NODE_BYTES = 700
+LEXBOR_BYTES_PER_CHAR = 20
+
+
+def content_digest(html_content):
+    """页面内容的摘要：内容相同即可复用解析结果，与网址和获取方式无关"""
+    return hashlib.blake2b(html_content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def estimate_size(document, html_content):
+    """估算解析树占用的内存（字节）"""
+    if isinstance(document, LexborNode):
+        return len(html_content) * LEXBOR_BYTES_PER_CHAR
+    return sum(1 for _ in document.descendants) * SOUP_NODE_BYTES
+
+
+class DocumentCache:
+    """按内容摘要缓存已解析文档的LRU，按估算的解析树大小限制内存
+
+    文档在多次调用之间共享，使用方只能读取，不能修改（decompose、extract等）。
+    """
+
+    def __init__(self, max_bytes=DOCUMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (摘要, 解析方式) -> (文档, 估算大小)
+        self._variants = {}  # 摘要 -> 已缓存的解析方式数
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def document(self, html_content, variant, build, full=None):
+        """返回按variant解析的文档，未命中时调用build()解析并缓存
+
+        full为(完整文档的解析方式, 解析函数)时，已缓存的完整文档也可以直接使用；
+        同一内容已经按其它方式解析过（如换了一组类名再次提取）时改为解析完整文档，
+        之后任何类名组合都能命中。
+        """
+        if self.max_bytes <= 0 or not html_content:
+            return build()
+        digest = content_digest(html_content)
+        candidates = (variant,) if full is None else (variant, full[0])
+        for candidate in candidates:
+            document = self._get((digest, candidate))
+            if document is not None:
+                self._record('hits')
+                count('doc_cache_hit')
+                return document
+        self._record('misses')
+        count('doc_cache_miss')
+        if full is not None and self._has_content(digest):
+            variant, build = full
+        document = build()
+        self._put((digest, variant), document, estimate_size(document, html_content))
+        return document
+
+    def stats(self):
+        """命中、未命中、写入、淘汰次数，命中率，以及当前的估算内存和文档数"""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+            stats['bytes'] = self._bytes
+            stats['entries'] = len(self._entries)
+            return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._variants.clear()
+            self._bytes = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _has_content(self, digest):
+        with self._lock:
+            return digest in self._variants
+
+    def _put(self, key, document, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._stats['stores'] += 1
+            self._discard(key)
+            self._entries[key] = (document, size)
+            self._variants[key[0]] = self._variants.get(key[0], 0) + 1
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._discard(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        self._variants[key[0]] -= 1
+        if not self._variants[key[0]]:
+            del self._variants[key[0]]
+
+    def _record(self, outcome):
+        with self._lock:
+            self._stats[outcome] += 1
+
+
+_document_cache = DocumentCache()
+
+
+def get_document_cache():
+    """获取进程级共享的已解析文档缓存"""
+    return _document_cache
+
+
+def cached_soup(html_content):
+    """完整解析的BeautifulSoup文档（共享，只读）"""
+    return _document_cache.document(html_content, ('soup', resolve_parser()), lambda: make_soup(html_content))
+
+
+def cached_partial_soup(html_content, class_lists):
+    """只包含目标类名子树以及<meta>、<title>的文档（共享，只读），已有完整文档时直接使用完整文档"""
+    parser = resolve_parser()
+    variant = ('partial', parser, tuple(tuple(class_list) for class_list in class_lists))
+    full = (('soup', parser), lambda: make_soup(html_content))
+    return _document_cache.document(html_content, variant, lambda: make_partial_soup(html_content, class_lists), full)
+
+
+def cached_link_document(html_content):
+    """链接提取用的文档（共享，只读）"""
+    return _document_cache.document(html_content, ('link', LINK_PARSER), lambda: make_link_document(html_content))
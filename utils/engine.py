@@ -0,0 +1,210 @@
+import asyncio
+import os
+import selectors
+import threading
+from asyncio import events
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+from utils.politeness import HostScheduler
+
+try:
+    from gevent.monkey import is_module_patched
+except ImportError:  # 没有安装gevent时按普通线程运行
+    is_module_patched = None
+
+# 抓取引擎并发配置（可通过环境变量调整）
+FETCH_CONCURRENCY = int(os.environ.get('XHB_FETCH_CONCURRENCY', '64'))  # 同时进行的请求总数
+HOST_CONCURRENCY = int(os.environ.get('XHB_HOST_CONCURRENCY', '8'))  # 同一主机同时进行的请求数上限
+# 保留调度状态的主机数，超过时淘汰最久未使用的空闲主机
+MAX_HOSTS = 1024
+# 执行磁盘缓存读写等阻塞操作的系统线程数
+BLOCKING_THREADS = 4
+
+
+class _GreenletSafeSelector(selectors.DefaultSelector):
+    """gevent环境下使用的选择器
+
+    打过monkey patch后事件循环运行在一个greenlet中，而“当前运行的事件循环”是按系统线程记录的。
+    事件循环只在select处让出，让出期间清除该记录，避免同一线程上的其它greenlet
+    误以为自己运行在事件循环中（例如调用asyncio.run时报错）。
+    """
+
+    def select(self, timeout=None):
+        loop = events._get_running_loop()
+        events._set_running_loop(None)
+        try:
+            return super().select(timeout)
+        finally:
+            events._set_running_loop(loop)
+
+
+class FetchEngine:
+    """在后台事件循环上运行的异步抓取核心
+
+    所有请求在同一个事件循环中并发进行，受总并发数限制；每个主机由HostScheduler
+    按令牌桶、Retry-After和自适应并发上限调度，调度状态在调用之间保留。
+    工具通过同步接口（run、map_unordered）调用，调用线程只等待结果，
+    不再为每个并发请求占用一个线程。
+    """
+
+    def __init__(self, concurrency=FETCH_CONCURRENCY, host_concurrency=HOST_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self.host_concurrency = max(1, host_concurrency)
+        self._loop = None
+        self._lock = threading.Lock()
+        self._limit = None
+        self._hosts = OrderedDict()
+        self._green = is_module_patched is not None and is_module_patched('threading')
+        self._blocking_pool = None
+
+    @property
+    def loop(self):
+        """后台事件循环，第一次使用时启动"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    self._loop = self._start_loop()
+        return self._loop
+
+    def _start_loop(self):
+        loop = asyncio.SelectorEventLoop(_GreenletSafeSelector()) if self._green else asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name='xhb-fetch-engine', daemon=True).start()
+        return loop
+
+    @asynccontextmanager
+    async def host_slot(self, url):
+        """在事件循环中占用一个请求槽位：先由主机的调度器放行，再等待总槽位
+
+        产出该主机的HostScheduler，调用方用它报告请求结果（成功、被限流或出错）。
+        """
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.concurrency)
+        scheduler = self.scheduler(urlparse(url).netloc.lower())
+        await scheduler.acquire()
+        try:
+            async with self._limit:
+                yield scheduler
+        finally:
+            scheduler.release()
+
+    def scheduler(self, host):
+        """获取主机的调度器，不存在时创建"""
+        scheduler = self._hosts.get(host)
+        if scheduler is None:
+            scheduler = self._hosts[host] = HostScheduler(self.host_concurrency)
+            if len(self._hosts) > MAX_HOSTS:
+                for name in [name for name, item in self._hosts.items() if item.is_idle()][:len(self._hosts) - MAX_HOSTS]:
+                    del self._hosts[name]
+        else:
+            self._hosts.move_to_end(host)
+        return scheduler
+
+    async def run_blocking(self, func, *args):
+        """在系统线程中执行阻塞操作（如磁盘读写），事件循环上的其它请求不受影响
+
+        打过monkey patch后普通线程池中的“线程”也是greenlet，阻塞调用仍会卡住事件循环，
+        因此使用gevent的原生线程池，完成后通过call_soon_threadsafe唤醒事件循环。
+        """
+        loop = asyncio.get_running_loop()
+        if self._blocking_pool is None:
+            self._blocking_pool = _create_blocking_pool(self._green)
+        if not self._green:
+            return await loop.run_in_executor(self._blocking_pool, func, *args)
+
+        future = loop.create_future()
+
+        def call():
+            # 异常作为结果返回，避免gevent在线程池中打印堆栈
+            try:
+                return True, func(*args)
+            except Exception as e:
+                return False, e
+
+        def done(result):
+            loop.call_soon_threadsafe(_resolve, future, *result.value)
+
+        self._blocking_pool.spawn(call).rawlink(done)
+        return await future
+
+    def submit(self, coro):
+        """把协程提交到事件循环，返回concurrent.futures.Future，取消Future时同时取消协程"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """同步执行协程并返回结果，超过timeout秒时取消协程并抛出TimeoutError"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def map_unordered(self, func, items, limit=None):
+        """并发执行func(item)返回的协程，按完成顺序产出(序号, 结果, 异常)
+
+        items可以是逐步产生的迭代器，同时进行的协程不超过limit个，有空位时才读取下一项。
+        调用方提前停止读取时取消尚未完成的协程。
+        """
+        limit = max(1, int(limit or self.concurrency))
+        items = iter(items)
+        pending = {}
+        exhausted = False
+        index = 0
+        try:
+            while True:
+                while not exhausted and len(pending) < limit:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[self.submit(func(item))] = index
+                    index += 1
+                if not pending:
+                    return
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    position = pending.pop(future)
+                    error = future.exception()
+                    yield position, None if error else future.result(), error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def stats(self):
+        """各主机的调度状态：并发上限、进行中和排队的请求数、暂停剩余秒数、平均延迟和计数"""
+        return {host: scheduler.stats() for host, scheduler in list(self._hosts.items())}
+
+
+def _create_blocking_pool(green):
+    if green:
+        from gevent.threadpool import ThreadPool
+        return ThreadPool(BLOCKING_THREADS)
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=BLOCKING_THREADS, thread_name_prefix='xhb-blocking')
+
+
+def _resolve(future, ok, value):
+    if future.done():  # 等待方已被取消
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """获取进程级共享的抓取引擎"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = FetchEngine()
+    return _engine
@@ -0,0 +1,448 @@
+import asyncio
+import copy
+import email.utils
+import importlib.util
+import logging
+import os
+import time
+
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from utils.browser import USER_AGENT
+from utils.cache import KEPT_HEADERS, CacheEntry, freshness_lifetime, get_response_cache, normalize_url
+from utils.engine import get_engine
+from utils.metrics import record_fetch
+from utils.singleflight import get_fetch_flight
+
+logger = logging.getLogger(__name__)
+# httpx默认为每个请求输出一条INFO日志，只保留警告
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+# 连接和重试配置（可通过环境变量调整）
+KEEPALIVE_CONNECTIONS = int(os.environ.get('XHB_HTTP_KEEPALIVE', '32'))  # 保留的keep-alive连接数
+RETRIES = int(os.environ.get('XHB_HTTP_RETRIES', '2'))
+RETRY_BACKOFF = float(os.environ.get('XHB_HTTP_RETRY_BACKOFF', '0.3'))
+# 限流（429/503）后的重试次数，单独计数：调度器已按Retry-After暂停该主机，重试时等待暂停结束即可
+THROTTLE_RETRIES = int(os.environ.get('XHB_HTTP_THROTTLE_RETRIES', '5'))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# 表示服务器要求降速的状态码
+THROTTLE_STATUSES = (429, 503)
+# 单次抓取（包括排队、重试和下载）的总时间上限
+DEADLINE = float(os.environ.get('XHB_HTTP_DEADLINE', '60'))
+
+# 响应体（解压后）大小上限，超过时中止下载；0表示不限制
+MAX_BYTES = int(os.environ.get('XHB_HTTP_MAX_BYTES', str(10 * 1024 * 1024)))
+# 只接受HTML类内容，其它Content-Type在读取响应体之前中止
+HTML_ONLY = os.environ.get('XHB_HTTP_HTML_ONLY', '1') != '0'
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/xml', 'application/xml', 'text/plain')
+CHUNK_SIZE = 64 * 1024
+
+# httpx的trace事件与计时阶段的对应关系（connect包括DNS解析和TCP握手）
+_TRACE_PHASES = {
+    'connect_tcp': 'connect',
+    'start_tls': 'tls',
+    'send_request_headers': 'wait',
+    'send_request_body': 'wait',
+    'receive_response_headers': 'wait',
+}
+
+# 安装了brotli时才声明支持br压缩，httpx会自动解压
+BROTLI_AVAILABLE = any(importlib.util.find_spec(name) is not None for name in ('brotli', 'brotlicffi'))
+ACCEPT_ENCODING = 'gzip, deflate, br' if BROTLI_AVAILABLE else 'gzip, deflate'
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不报告峰值RSS
+    resource = None
+
+# 只在抓取引擎的事件循环中访问
+_client = None
+
+
+class _FetchTimer:
+    """记录一次抓取（包括重试）各阶段的耗时（秒）
+
+    queue为等待主机调度器放行的时间，connect、tls、wait（发出请求到收到响应头）
+    来自httpx的trace扩展，download为读取响应体的时间。复用keep-alive连接时没有connect和tls。
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self._started = {}
+
+    def add(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    async def __call__(self, event, info):
+        # 事件名形如 connection.connect_tcp.started、http11.receive_response_headers.complete
+        step, _, state = event.partition('.')[2].rpartition('.')
+        phase = _TRACE_PHASES.get(step)
+        if phase is None:
+            return
+        now = time.perf_counter()
+        if state == 'started':
+            self._started[step] = now
+        elif step in self._started:
+            self.add(phase, now - self._started.pop(step))
+
+
+class ResponseTooLarge(requests.exceptions.RequestException):
+    """响应体超过大小上限"""
+
+
+class UnsupportedContentType(requests.exceptions.RequestException):
+    """响应不是HTML内容"""
+
+
+def _get_client():
+    """获取事件循环中共享的HTTP客户端
+
+    同一主机的请求复用keep-alive连接，避免每次都重新握手。
+    并发数由抓取引擎控制，客户端本身不再限制连接数。
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=KEEPALIVE_CONNECTIONS),
+            headers={
+                'User-Agent': USER_AGENT,
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'Accept-Encoding': ACCEPT_ENCODING,
+            },
+        )
+    return _client
+
+
+def fetch(url, timeout=10, headers=None, cache_ttl=None, max_bytes=None):
+    """同步抓取：在抓取引擎的事件循环中执行fetch_async并等待结果
+
+    超过XHB_HTTP_DEADLINE秒（包括排队和重试）时取消请求并抛出Timeout。
+    """
+    try:
+        response = get_engine().run(fetch_async(url, timeout, headers, cache_ttl, max_bytes), DEADLINE)
+    except TimeoutError:
+        raise requests.exceptions.Timeout(f"抓取超过 {DEADLINE} 秒: {url}")
+    record_fetch(response)
+    return response
+
+
+def fetch_many(urls, timeout=10, cache_ttl=None, concurrency=None):
+    """并发抓取多个网址，按完成顺序产出(序号, 网址, 响应, 异常)
+
+    urls可以是逐步产生网址的迭代器，同时进行的请求不超过concurrency个。
+    所有请求共用抓取引擎的一个事件循环，不占用额外线程。
+    """
+    async def fetch_one(url):
+        try:
+            response = await asyncio.wait_for(fetch_async(url, timeout, cache_ttl=cache_ttl), DEADLINE)
+        except asyncio.TimeoutError:
+            raise requests.exceptions.Timeout(f"抓取超过 {DEADLINE} 秒: {url}")
+        return url, response
+
+    submitted = []
+
+    def tracked():
+        for url in urls:
+            submitted.append(url)
+            yield url
+
+    for index, result, error in get_engine().map_unordered(fetch_one, tracked(), concurrency):
+        if error is None:
+            record_fetch(result[1])
+            yield index, result[0], result[1], None
+        else:
+            yield index, submitted[index], None, error
+
+
+async def fetch_async(url, timeout=10, headers=None, cache_ttl=None, max_bytes=None):
+    """发起GET请求，非2xx状态码抛出异常
+
+    响应经过共享缓存：新鲜的缓存直接返回，过期但带ETag/Last-Modified的缓存
+    先发条件请求，服务器返回304时复用缓存内容。cache_ttl为None时遵守
+    Cache-Control/Expires，大于0时覆盖新鲜期，等于0时跳过缓存。
+    响应体流式读取，超过max_bytes（默认MAX_BYTES）或不是HTML时中止。
+    同时进行的相同请求只下载一次，各调用方共享同一份响应内容（只读使用）；
+    只有发起下载的调用方记录缓存统计并写入缓存，其它调用方计为合并（coalesced）。
+    """
+    if cache_ttl is not None and cache_ttl <= 0:
+        response, _ = await _shared_download(url, headers, timeout, max_bytes)
+        response.raise_for_status()
+        return response
+
+    cache = get_response_cache()
+    key = normalize_url(url)
+    entry = cache.get_memory(key)
+    if entry is None and cache.disk_max_bytes > 0:
+        # 磁盘读取放到线程中，不阻塞事件循环上的其它请求
+        entry = await get_engine().run_blocking(cache.load, key)
+    if entry is not None and entry.is_fresh():
+        cache.record('hits')
+        _log_cache('命中', url, cache)
+        return _response_from_entry(entry, 'hit')
+
+    request_headers = dict(headers or {})
+    if entry is not None:
+        request_headers.update(entry.validators())
+    response, leader = await _shared_download(url, request_headers, timeout, max_bytes)
+    if not leader:
+        # 合并到进行中下载的调用方：发起方已经记录并写入缓存，不重复计数和写入
+        cache.record('coalesced')
+        _log_cache('合并', url, cache)
+        if response.status_code == 304 and entry is not None:
+            return _response_from_entry(entry, 'coalesced', response.fetch_info)
+        response.raise_for_status()
+        return response
+
+    if response.status_code == 304 and entry is not None:
+        # 内容未变化，刷新缓存的新鲜期
+        cache.record('revalidated')
+        _log_cache('重新验证', url, cache)
+        entry = await _store(cache, key, entry.url, entry.body, _merge_headers(entry.headers, response.headers), cache_ttl) or entry
+        return _response_from_entry(entry, 'revalidated', response.fetch_info)
+
+    response.raise_for_status()
+    cache.record('misses')
+    _log_cache('未命中', url, cache)
+    if response.status_code == 200:
+        await _store(cache, key, response.url, response.content, response.headers, cache_ttl)
+    return response
+
+
+async def _shared_download(url, headers, timeout, max_bytes=None):
+    """规范化网址、请求头和大小上限都相同的并发下载合并为一次，超时按先发起的请求
+
+    返回(响应, 是否为发起下载的调用方)；合并进来的调用方得到响应的浅拷贝，
+    下载字节数和重试次数只计入发起方。
+    """
+    key = (normalize_url(url), tuple(sorted((headers or {}).items())), max_bytes)
+    flight = get_fetch_flight()
+    leader = key not in flight
+    response = await flight.do(key, lambda: _download(url, headers, timeout, max_bytes))
+    if leader:
+        return response, True
+    logger.info(f"合并进行中的请求: {url} (已合并{flight.stats()['shared']}次)")
+    coalesced = copy.copy(response)
+    coalesced.fetch_info = dict(response.fetch_info, cache='coalesced', bytes=0, retries=0)
+    return coalesced, False
+
+
+async def _download(url, headers, timeout, max_bytes=None):
+    """经主机调度器放行后发送请求并流式读取响应体
+
+    每次请求的结果报告给调度器：429/503视为限流（按Retry-After暂停该主机），
+    连接失败、超时和5xx错误使该主机的并发上限减半，成功时记录延迟。
+    可重试的失败在释放槽位后退避重试，重试同样经过调度器。
+    限流后的重试不占用普通重试次数（RETRIES），也不额外退避，而是在调度器中等待主机暂停结束，
+    次数由THROTTLE_RETRIES限制。
+    """
+    engine = get_engine()
+    timer = _FetchTimer()
+    attempt = 0  # 普通重试次数
+    throttled = 0  # 限流重试次数
+    while True:
+        throttle = False
+        queued = time.perf_counter()
+        async with engine.host_slot(url) as scheduler:
+            timer.add('queue', time.perf_counter() - queued)
+            started = time.monotonic()
+            try:
+                upstream = await _send(url, headers, timeout, timer)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                scheduler.on_error()
+                if attempt >= RETRIES:
+                    raise
+            else:
+                status = upstream.status_code
+                throttle = status in THROTTLE_STATUSES
+                if throttle:
+                    scheduler.on_throttle(parse_retry_after(upstream.headers.get('Retry-After')))
+                elif status in RETRY_STATUSES:
+                    scheduler.on_error()
+                else:
+                    scheduler.on_success(time.monotonic() - started)
+                exhausted = throttled >= THROTTLE_RETRIES if throttle else attempt >= RETRIES
+                if status not in RETRY_STATUSES or exhausted:
+                    reading = time.perf_counter()
+                    response = await _read_body(url, upstream, max_bytes)
+                    timer.add('download', time.perf_counter() - reading)
+                    response.fetch_info = {
+                        'cache': 'miss', 'bytes': upstream.num_bytes_downloaded,
+                        'timings': timer.timings, 'retries': attempt + throttled,
+                    }
+                    return response
+                await upstream.aclose()
+        if throttle:
+            throttled += 1
+            continue
+        await asyncio.sleep(_retry_delay(attempt))
+        attempt += 1
+
+
+async def _send(url, headers, timeout, timer=None):
+    """发送请求并等待响应头，httpx的异常转换为对应的requests异常，工具无需区分"""
+    try:
+        client = _get_client()
+        request = client.build_request(
+            'GET', url, headers=headers, timeout=timeout, extensions={'trace': timer} if timer else None
+        )
+        return await client.send(request, stream=True)
+    except httpx.ConnectTimeout as e:
+        raise requests.exceptions.ConnectTimeout(str(e) or f"连接超时: {url}")
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.ReadTimeout(str(e) or f"读取超时: {url}")
+    except httpx.TooManyRedirects as e:
+        raise requests.exceptions.TooManyRedirects(str(e))
+    except httpx.UnsupportedProtocol as e:
+        raise requests.exceptions.InvalidSchema(str(e))
+    except httpx.TransportError as e:
+        raise requests.exceptions.ConnectionError(str(e) or f"连接失败: {url}")
+    except (httpx.InvalidURL, httpx.HTTPError) as e:
+        raise requests.exceptions.RequestException(str(e))
+
+
+def _retry_delay(attempt):
+    """第一次重试立即进行，之后指数退避（Retry-After由主机调度器处理）"""
+    return 0 if attempt == 0 else RETRY_BACKOFF * (2 ** attempt)
+
+
+def parse_retry_after(value):
+    """解析Retry-After头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+async def _read_body(url, upstream, max_bytes=None):
+    """流式读取响应体
+
+    - 先检查Content-Type和Content-Length，不是HTML或声明的长度超过上限时不读取响应体
+    - 边下载边解压（gzip/deflate/br），按解压后的字节数计算上限，压缩炸弹也会被及时中止
+    - 304和错误状态码的响应体不读取，由调用方处理
+    """
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    rss_before = _peak_rss_mb()
+    response = _build_response(upstream)
+    try:
+        if response.status_code == 304 or response.status_code >= 400:
+            return response
+
+        content_type = response.headers.get('Content-Type', '')
+        media_type = content_type.split(';')[0].strip().lower()
+        if HTML_ONLY and media_type and media_type not in HTML_CONTENT_TYPES:
+            raise UnsupportedContentType(f"不是HTML内容: {content_type}", response=response)
+
+        declared = response.headers.get('Content-Length')
+        if max_bytes and declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ResponseTooLarge(f"响应体 {declared} 字节超过上限 {max_bytes} 字节", response=response)
+
+        chunks = []
+        size = 0
+        try:
+            async for chunk in upstream.aiter_bytes(CHUNK_SIZE):
+                if not chunks and HTML_ONLY and not media_type and b'\x00' in chunk[:1024]:
+                    # 没有Content-Type时用第一块内容嗅探，二进制内容直接中止
+                    raise UnsupportedContentType("不是HTML内容: 二进制数据", response=response)
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise ResponseTooLarge(f"响应体超过上限 {max_bytes} 字节", response=response)
+                chunks.append(chunk)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(str(e) or f"读取超时: {url}")
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ChunkedEncodingError(str(e))
+        response._content = b''.join(chunks)
+        del chunks
+    finally:
+        # 读取完毕或中止时立即释放连接（中止时丢弃剩余数据）
+        await upstream.aclose()
+
+    _log_download(url, response, upstream.num_bytes_downloaded, rss_before)
+    return response
+
+
+def _build_response(upstream):
+    """用httpx响应头构造requests.Response，工具继续按requests的接口使用"""
+    response = requests.Response()
+    response._content = b''
+    response._content_consumed = True
+    response.status_code = upstream.status_code
+    response.reason = upstream.reason_phrase
+    response.headers = CaseInsensitiveDict(upstream.headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = str(upstream.url)
+    return response
+
+
+def _peak_rss_mb():
+    """当前进程的峰值RSS（MB），无法获取时返回None"""
+    if resource is None:
+        return None
+    # Linux上ru_maxrss的单位是KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _log_download(url, response, transferred, rss_before):
+    peak = _peak_rss_mb()
+    if peak is None:
+        logger.info(f"下载完成: {url} ({len(response._content)}字节, 传输{transferred}字节)")
+    else:
+        logger.info(
+            f"下载完成: {url} ({len(response._content)}字节, 传输{transferred}字节, "
+            f"峰值RSS {peak:.1f}MB, 本次增长 {peak - rss_before:.1f}MB)"
+        )
+
+
+def _log_cache(outcome, url, cache):
+    stats = cache.stats()
+    logger.info(
+        f"响应缓存{outcome}: {url} (hits={stats['hits']}, misses={stats['misses']}, "
+        f"revalidated={stats['revalidated']}, coalesced={stats['coalesced']})"
+    )
+
+
+async def _store(cache, key, url, body, headers, ttl):
+    """按Cache-Control写入缓存，不可缓存时返回None；磁盘写入在线程中进行"""
+    kept = {name: headers[name] for name in KEPT_HEADERS if headers.get(name)}
+    lifetime = freshness_lifetime(kept, ttl)
+    if lifetime is None:
+        return None
+    # 没有新鲜期又无法重新验证的响应不缓存
+    if lifetime <= 0 and not ('etag' in kept or 'last-modified' in kept):
+        return None
+    now = time.time()
+    entry = CacheEntry(url, body, kept, now, now + lifetime)
+    cache.put_memory(key, entry)
+    if cache.disk_max_bytes > 0:
+        await get_engine().run_blocking(cache.persist, key, entry)
+    return entry
+
+
+def _merge_headers(cached_headers, new_headers):
+    merged = dict(cached_headers)
+    for name in KEPT_HEADERS:
+        if new_headers.get(name):
+            merged[name] = new_headers[name]
+    return merged
+
+
+def _response_from_entry(entry, outcome, fetch_info=None):
+    """用缓存条目构造requests.Response，调用方无需区分是否命中缓存"""
+    response = requests.Response()
+    response._content = entry.body
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict(entry.headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = entry.url
+    # 命中缓存时没有下载，重新验证时保留条件请求的耗时
+    response.fetch_info = dict(fetch_info or {'bytes': 0, 'timings': {}, 'retries': 0}, cache=outcome)
+    return response
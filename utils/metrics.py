@@ -0,0 +1,231 @@
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('xhb.metrics')
+
+# 分阶段计时开关（可通过环境变量关闭）
+METRICS_ENABLED = os.environ.get('XHB_METRICS', '1') != '0'
+# 每次调用结束时输出一条JSON格式的INFO日志
+METRICS_LOG = os.environ.get('XHB_METRICS_LOG', '1') != '0'
+# 耗时直方图的桶上限（毫秒）
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# 当前工具调用的Trace，只在工具代码运行期间设置（见instrumented）
+_current = contextvars.ContextVar('xhb_trace', default=None)
+
+
+class Histogram:
+    """固定桶的耗时直方图，分位数按桶上限估算"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                # 最后一个桶没有上限，用最大值代替
+                return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        labels = [f'<={bound}' for bound in self.buckets] + ['+Inf']
+        return {
+            'count': self.count,
+            'sum_ms': round(self.total, 2),
+            'min_ms': round(self.min, 2) if self.min is not None else None,
+            'max_ms': round(self.max, 2) if self.max is not None else None,
+            'p50_ms': self.percentile(0.5),
+            'p90_ms': self.percentile(0.9),
+            'p99_ms': self.percentile(0.99),
+            'buckets': {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+
+class MetricsRegistry:
+    """进程内的指标登记：按名称累计耗时直方图（毫秒）和计数器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, name, value_ms):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(value_ms)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'histograms': {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())},
+                'counters': dict(sorted(self._counters.items())),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """获取进程级共享的指标登记"""
+    return _registry
+
+
+class Trace:
+    """一次工具调用的分阶段耗时（秒，同一阶段多次出现时累加）和计数
+
+    批量模式下多个线程同时写入，各阶段耗时为各任务之和，可能超过总耗时。
+    """
+
+    def __init__(self, tool, detailed=False):
+        self.tool = tool
+        self.detailed = detailed  # 需要输出metrics变量时才统计节点数等额外开销的指标
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def summary(self):
+        with self._lock:
+            return {
+                'tool': self.tool,
+                'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+                'phases_ms': {phase: round(seconds * 1000, 2) for phase, seconds in self.phases.items()},
+                'counts': dict(self.counts),
+            }
+
+
+@contextmanager
+def phase(name):
+    """把代码块的耗时计入当前调用的指定阶段，不在工具调用中时不做任何事"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_time(name, time.perf_counter() - started)
+
+
+def count(name, value=1):
+    """累加当前调用的计数"""
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, value)
+
+
+def count_nodes(document):
+    """需要详细指标时统计文档的元素数"""
+    trace = _current.get()
+    if trace is None or not trace.detailed or document is None:
+        return
+    # LexborNode（selectolax）和BeautifulSoup都支持find_all()查找全部元素
+    trace.count('nodes', len(document.find_all()))
+
+
+def record_fetch(response):
+    """把一次下载的各阶段耗时、字节数和缓存结果计入当前调用"""
+    trace = _current.get()
+    info = getattr(response, 'fetch_info', None)
+    if trace is None or info is None:
+        return
+    for name, seconds in info['timings'].items():
+        trace.add_time(name, seconds)
+    trace.count('fetches')
+    trace.count(f"cache_{info['cache']}")
+    if info['bytes']:
+        trace.count('bytes', info['bytes'])
+    if info['retries']:
+        trace.count('retries', info['retries'])
+
+
+def instrumented(tool):
+    """装饰工具的_invoke：记录本次调用的各阶段耗时并汇总
+
+    - 调用结束后计入指标登记（按“工具.阶段”累计直方图）并输出一条结构化日志
+    - 参数include_metrics为真时最后额外输出metrics变量
+    Trace只在工具代码运行期间设为当前值，不会泄漏到调用方的上下文。
+    """
+    def decorate(invoke):
+        @functools.wraps(invoke)
+        def wrapper(self, tool_parameters):
+            if not METRICS_ENABLED:
+                yield from invoke(self, tool_parameters)
+                return
+            include = bool(tool_parameters.get('include_metrics'))
+            trace = Trace(tool, detailed=include)
+            messages = invoke(self, tool_parameters)
+            try:
+                while True:
+                    token = _current.set(trace)
+                    try:
+                        message = next(messages)
+                    except StopIteration:
+                        break
+                    finally:
+                        _current.reset(token)
+                    yield message
+            finally:
+                messages.close()
+            summary = trace.summary()
+            _publish(summary)
+            if include:
+                yield self.create_variable_message('metrics', summary)
+        return wrapper
+    return decorate
+
+
+def _publish(summary):
+    tool = summary['tool']
+    _registry.observe(f'{tool}.total', summary['total_ms'])
+    for name, value in summary['phases_ms'].items():
+        _registry.observe(f'{tool}.{name}', value)
+    _registry.increment(f'{tool}.calls')
+    for name, value in summary['counts'].items():
+        _registry.increment(f'{tool}.{name}', value)
+    if METRICS_LOG:
+        logger.info(json.dumps(summary, ensure_ascii=False))
@@ -0,0 +1,192 @@
+import importlib.util
+import os
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# 解析器配置：auto表示使用已安装的最快后端
+HTML_PARSER = os.environ.get('XHB_HTML_PARSER', 'auto')
+LINK_PARSER = os.environ.get('XHB_LINK_PARSER', 'auto')
+# 局部解析：htmlextract只构建目标类名对应的子树以及<meta>、<title>
+PARTIAL_PARSE = os.environ.get('XHB_PARTIAL_PARSE', '1') != '0'
+
+# BeautifulSoup后端按速度从快到慢排列
+BS4_BACKENDS = ('lxml', 'html.parser', 'html5lib')
+
+LXML_AVAILABLE = importlib.util.find_spec('lxml') is not None
+HTML5LIB_AVAILABLE = importlib.util.find_spec('html5lib') is not None
+SELECTOLAX_AVAILABLE = importlib.util.find_spec('selectolax') is not None
+
+_AVAILABLE = {
+    'lxml': LXML_AVAILABLE,
+    'html.parser': True,
+    'html5lib': HTML5LIB_AVAILABLE,
+}
+
+
+def available_parsers():
+    """返回已安装的BeautifulSoup后端，按速度排序"""
+    return [name for name in BS4_BACKENDS if _AVAILABLE[name]]
+
+
+def resolve_parser(name=None):
+    """确定实际使用的BeautifulSoup后端，指定的后端未安装时回落到最快的可用后端"""
+    name = name or HTML_PARSER
+    if name in _AVAILABLE and _AVAILABLE[name]:
+        return name
+    return available_parsers()[0]
+
+
+def make_soup(html_content, parser=None, **kwargs):
+    """使用配置的后端构建BeautifulSoup文档"""
+    return BeautifulSoup(html_content, resolve_parser(parser), **kwargs)
+
+
+def make_partial_soup(html_content, class_lists, tag_names=('meta', 'title'), parser=None):
+    """只解析需要的部分
+
+    保留指定标签以及class与任一类名匹配的元素（连同其全部子孙），跳过导航、
+    评论、广告等无关区域。匹配规则与 find_all(class_=re.compile(类名)) 相同，
+    因此精确匹配、单类名匹配、模糊匹配三种查找策略在局部文档上的结果与完整解析一致。
+    html5lib不支持局部解析，类名不是合法正则时也回落到完整解析。
+    """
+    parser = resolve_parser(parser)
+    if not PARTIAL_PARSE or parser == 'html5lib':
+        return make_soup(html_content, parser)
+    try:
+        patterns = [re.compile(name) for class_list in class_lists for name in class_list]
+    except re.error:
+        return make_soup(html_content, parser)
+    return BeautifulSoup(html_content, parser, parse_only=TargetStrainer(tag_names, patterns))
+
+
+def make_link_document(html_content, parser=None):
+    """为只做元素选择的链接提取构建文档
+
+    安装了selectolax时默认使用lexbor快速路径，返回与BeautifulSoup接口兼容的
+    LexborNode；否则返回普通的BeautifulSoup文档。
+    """
+    parser = parser or LINK_PARSER
+    if parser == 'selectolax' or (parser == 'auto' and SELECTOLAX_AVAILABLE):
+        if SELECTOLAX_AVAILABLE:
+            from selectolax.lexbor import LexborHTMLParser
+            return LexborNode(LexborHTMLParser(html_content).root, is_document=True)
+        parser = None
+    return make_soup(html_content, None if parser == 'auto' else parser)
+
+
+def element_key(element):
+    """元素的身份标识，用于按身份去重
+
+    BeautifulSoup的Tag按完整内容比较和哈希，代价很高且会把内容相同的不同元素视为同一个。
+    """
+    return element._node.mem_id if isinstance(element, LexborNode) else id(element)
+
+
+def _class_matches(class_attr, matcher):
+    """与BeautifulSoup的class_匹配规则一致：匹配任一类名或完整的class属性值"""
+    if class_attr is None:
+        return False
+    values = class_attr.split()
+    if hasattr(matcher, 'search'):
+        return any(matcher.search(value) for value in values) or (
+            len(values) > 1 and bool(matcher.search(' '.join(values)))
+        )
+    return matcher in values or matcher == ' '.join(values)
+
+
+class TargetStrainer(SoupStrainer):
+    """按标签名或class正则筛选顶层元素的SoupStrainer
+
+    同时实现新版BeautifulSoup（4.13+）的allow_tag_creation接口和旧版的search_tag接口。
+    """
+
+    def __init__(self, tag_names, class_patterns):
+        super().__init__()
+        self.tag_names = frozenset(tag_names)
+        self.class_patterns = class_patterns
+
+    def wants(self, name, attrs):
+        if name in self.tag_names:
+            return True
+        if not attrs or not self.class_patterns:
+            return False
+        class_attr = attrs.get('class') if hasattr(attrs, 'get') else dict(attrs).get('class')
+        if not class_attr:
+            return False
+        if not isinstance(class_attr, str):
+            class_attr = ' '.join(class_attr)
+        return any(_class_matches(class_attr, pattern) for pattern in self.class_patterns)
+
+    @property
+    def excludes_everything(self):
+        return False
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.wants(name, attrs)
+
+    def allow_string_creation(self, string):
+        return False
+
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        return markup_name if self.wants(markup_name, markup_attrs) else None
+
+    def search(self, markup):
+        return None
+
+
+class LexborNode:
+    """selectolax节点的适配器，提供链接提取用到的BeautifulSoup接口子集"""
+
+    __slots__ = ('_node', '_is_document')
+
+    def __init__(self, node, is_document=False):
+        self._node = node
+        self._is_document = is_document
+
+    @property
+    def name(self):
+        return self._node.tag
+
+    def get(self, key, default=None):
+        attributes = self._node.attributes
+        if key not in attributes:
+            return default
+        # 与BeautifulSoup一致，无值属性返回空字符串
+        value = attributes[key]
+        return '' if value is None else value
+
+    def select(self, selector):
+        """CSS选择器查找后代元素（与BeautifulSoup一样不包含自身）"""
+        return [LexborNode(node) for node in self._node.css(selector) if self._is_descendant(node)]
+
+    def find_all(self, name=None, class_=None, href=None):
+        """按标签名、class和href查找后代元素"""
+        if class_ is None:
+            selector = name or '*'
+            if href:
+                selector += '[href]'
+            return self.select(selector)
+
+        results = []
+        for node in self._node.traverse():
+            if not self._is_descendant(node):
+                continue
+            if name and node.tag != name:
+                continue
+            attributes = node.attributes
+            if href and 'href' not in attributes:
+                continue
+            if not _class_matches(attributes.get('class'), class_):
+                continue
+            results.append(LexborNode(node))
+        return results
+
+    def _is_descendant(self, node):
+        return self._is_document or node.mem_id != self._node.mem_id
+
+    def __eq__(self, other):
+        return isinstance(other, LexborNode) and self._node.mem_id == other._node.mem_id
+
+    def __hash__(self):
+        return hash(self._node.mem_id)
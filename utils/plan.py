@@ -0,0 +1,189 @@
+import os
+import re
+from functools import lru_cache
+
+from utils.replace import MultiReplacer
+
+# 每种提取计划缓存的参数组合数（可通过环境变量调整）
+PLAN_CACHE_SIZE = int(os.environ.get('XHB_PLAN_CACHE_SIZE', '256'))
+
+_HTML_TAG = re.compile(r'^<([a-zA-Z][a-zA-Z0-9]*)>$')
+
+
+def parse_class_names(class_names):
+    """解析类名字符串，支持空格和逗号分隔"""
+    if not class_names:
+        return []
+    return [part for part in class_names.replace(',', ' ').split() if part]
+
+
+def parse_replacement_strings(input_str):
+    """解析替换字符串：包含逗号时按逗号分割，否则整个字符串作为一项（支持带空格的英文短语）"""
+    if not input_str:
+        return []
+    if ',' in input_str:
+        return [part.strip() for part in input_str.split(',') if part.strip()]
+    input_str = input_str.strip()
+    return [input_str] if input_str else []
+
+
+def extract_tag_name(text):
+    """从HTML标签格式（如<li>）中提取标签名，不是标签格式时返回None"""
+    match = _HTML_TAG.match(text.strip())
+    return match.group(1) if match else None
+
+
+class ClassQuery:
+    """一组类名的预处理结果，供三种查找策略共用
+
+    策略1的CSS选择器在构建时生成，策略3的正则在第一次用到时编译并随计划一起缓存。
+    """
+
+    __slots__ = ('class_list', 'selector', '_patterns')
+
+    def __init__(self, class_names):
+        self.class_list = parse_class_names(class_names)
+        # 策略1：多个类名时精确匹配全部类名
+        self.selector = '.' + '.'.join(self.class_list) if len(self.class_list) > 1 else None
+        self._patterns = None
+
+    def __bool__(self):
+        return bool(self.class_list)
+
+    def tag_selector(self, tag=None):
+        return tag + self.selector if tag and self.selector else self.selector
+
+    @property
+    def patterns(self):
+        """策略3（模糊匹配）用到的正则，类名不是合法正则时与原来一样抛出re.error"""
+        if self._patterns is None:
+            self._patterns = [re.compile(class_name) for class_name in self.class_list]
+        return self._patterns
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def class_query(class_names):
+    """获取类名字符串对应的ClassQuery（跨调用缓存）"""
+    return ClassQuery(class_names)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def block_matcher(blockurl):
+    """根据屏蔽关键词构建链接过滤函数（跨调用缓存），所有关键词合并为一个正则，一次扫描完成匹配"""
+    # 解析屏蔽关键词（不区分大小写）
+    block_keywords = [keyword.lower() for keyword in parse_class_names(blockurl)]
+    pattern = re.compile('|'.join(re.escape(keyword) for keyword in block_keywords)) if block_keywords else None
+
+    def is_blocked(url):
+        # 自动屏蔽空链接和javascript链接
+        if not url or url.strip() == '' or url.strip() == '#' or url.lower().startswith('javascript:'):
+            return True
+
+        # 检查URL是否包含任一屏蔽关键词
+        return bool(pattern and pattern.search(url.lower()))
+
+    return is_blocked
+
+
+class LinkPlan:
+    """listlink的提取计划：父容器、子元素/链接的查找方式和链接过滤函数"""
+
+    __slots__ = ('box', 'anchor', 'sub', 'sub_tag_name', 'is_blocked')
+
+    def __init__(self, boxclass, subclass, aclass, blockurl):
+        self.box = class_query(boxclass)
+        self.anchor = class_query(aclass) if aclass else None
+        self.sub = None
+        self.sub_tag_name = None
+        if not aclass and subclass:
+            tag_name = extract_tag_name(subclass)
+            if tag_name:
+                # HTML标签格式（如<li>、<span>等），直接按标签名查找
+                self.sub_tag_name = tag_name
+            else:
+                # CSS类名，按类名查找
+                self.sub = class_query(subclass)
+        self.is_blocked = block_matcher(blockurl)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def link_plan(boxclass, subclass, aclass, blockurl):
+    """获取listlink参数组合对应的提取计划（跨调用缓存）"""
+    return LinkPlan(boxclass or '', subclass or '', aclass or '', blockurl or '')
+
+
+class ArticlePlan:
+    """htmlextract的提取计划：各字段的查找方式、局部解析的类名以及替换/删除规则"""
+
+    __slots__ = (
+        'title', 'content', 'tag', 'source', 'partial_classes',
+        'replacements', 'delete_targets', 'rewriter', 'deleter',
+    )
+
+    def __init__(self, title_class, content_class, tag_class, source_class,
+                 content_target, content_text, deletecontent):
+        self.title = class_query(title_class)
+        self.content = class_query(content_class)
+        self.tag = class_query(tag_class) if tag_class else None
+        self.source = class_query(source_class) if source_class else None
+        # 局部解析只构建这些类名对应的子树
+        self.partial_classes = [
+            query.class_list for query in (self.title, self.content, self.tag, self.source) if query
+        ]
+        # 替换规则：目标和替换文本按顺序一一对应，多余的忽略
+        self.replacements = []
+        if content_target and content_text:
+            targets = parse_replacement_strings(content_target)
+            texts = parse_replacement_strings(content_text)
+            self.replacements = [(target, text) for target, text in zip(targets, texts) if target and text]
+        self.delete_targets = [target for target in parse_replacement_strings(deletecontent) if target]
+        deletions = [(target, '') for target in self.delete_targets]
+        # 与原来一样先替换后删除，各自一次扫描完成全部目标；替换只作用于标题、内容、关键词、描述
+        self.rewriter = MultiReplacer(self.replacements)
+        self.deleter = MultiReplacer(deletions)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def article_plan(title_class, content_class, tag_class='', source_class='',
+                 content_target='', content_text='', deletecontent=''):
+    """获取htmlextract参数组合对应的提取计划（跨调用缓存）"""
+    return ArticlePlan(title_class or '', content_class or '', tag_class or '', source_class or '',
+                       content_target or '', content_text or '', deletecontent or '')
+
+
+@lru_cache(maxsize=16)
+def meta_selectors(meta_name):
+    """按优先级排列的meta标签选择器"""
+    selectors = [
+        f'meta[name="{meta_name}"]',
+        f'meta[property="{meta_name}"]',
+        f'meta[name="{meta_name.lower()}"]',
+        f'meta[property="{meta_name.lower()}"]'
+    ]
+
+    # 如果是description，还要尝试og:description
+    if meta_name.lower() == "description":
+        selectors.extend([
+            'meta[property="og:description"]',
+            'meta[name="twitter:description"]'
+        ])
+
+    # 如果是keywords，还要尝试其他可能的属性名
+    if meta_name.lower() == "keywords":
+        selectors.extend([
+            'meta[name="keyword"]',
+            'meta[property="article:tag"]'
+        ])
+
+    return tuple(selectors)
+
+
+def plan_cache_info():
+    """返回各级计划缓存的命中统计"""
+    return {
+        name: func.cache_info()._asdict()
+        for name, func in (
+            ('class_query', class_query), ('block_matcher', block_matcher),
+            ('link_plan', link_plan), ('article_plan', article_plan),
+        )
+    }
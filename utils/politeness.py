@@ -0,0 +1,172 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+# 单主机调度配置（可通过环境变量调整）
+HOST_RATE = float(os.environ.get('XHB_HOST_RATE', '20'))  # 每秒请求数，0表示不限制
+HOST_BURST = int(os.environ.get('XHB_HOST_BURST', '20'))  # 令牌桶容量
+HOST_INITIAL_CONCURRENCY = int(os.environ.get('XHB_HOST_INITIAL_CONCURRENCY', '4'))
+HOST_ADAPTIVE = os.environ.get('XHB_HOST_ADAPTIVE', '1') != '0'
+HOST_MAX_PAUSE = float(os.environ.get('XHB_HOST_MAX_PAUSE', '60'))  # Retry-After的最长暂停秒数
+
+# 没有Retry-After时被限流后的暂停秒数
+THROTTLE_PAUSE = 1.0
+# 平均延迟超过基线的倍数时视为拥塞
+LATENCY_FACTOR = 3.0
+# 延迟的指数加权系数
+LATENCY_WEIGHT = 0.2
+# 接近上次被限流时的并发数后，需要多少倍的连续成功才再次试探加1
+PROBE_FACTOR = 8
+
+
+class HostScheduler:
+    """单个主机的礼貌调度：令牌桶限速、Retry-After暂停和AIMD自适应并发
+
+    - 每个请求消耗一个令牌，令牌按rate匀速补充，最多积累burst个
+    - 服务器返回429/503时按Retry-After暂停该主机的全部请求（没有时暂停1秒）
+    - 并发上限从initial开始，每连续成功“当前上限”个请求加1，直到max_limit；
+      被限流、连接失败或平均延迟明显高于基线时减半（同一窗口内只减一次）。
+      减半前的上限记为该主机的容忍上限，再次接近时放慢试探，避免反复触发限流
+
+    只在抓取引擎的事件循环中使用，不需要加锁。
+    """
+
+    def __init__(self, max_limit, initial=HOST_INITIAL_CONCURRENCY, rate=HOST_RATE, burst=HOST_BURST,
+                 adaptive=HOST_ADAPTIVE):
+        self.max_limit = max(1, max_limit)
+        self.adaptive = adaptive
+        self.limit = float(min(max(1, initial), self.max_limit) if adaptive else self.max_limit)
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.active = 0
+        self.paused_until = 0.0
+        self.latency = None
+        self.baseline = None
+        self.ceiling = None
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._refilled = None
+        self._waiters = deque()
+        self.counts = {'requests': 0, 'throttled': 0, 'errors': 0, 'decreases': 0}
+
+    def _now(self):
+        return time.monotonic()
+
+    def _admit_delay(self, now):
+        """距离可以发出下一个请求的秒数，受并发上限限制时返回None（等待其它请求结束）"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.active >= int(self.limit):
+            return None
+        if self.rate > 0:
+            if self._refilled is not None:
+                self.tokens = min(self.burst, self.tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+        return 0
+
+    async def acquire(self):
+        """等待暂停结束、并发槽位和令牌，然后占用一个槽位"""
+        while True:
+            delay = self._admit_delay(self._now())
+            if delay == 0:
+                break
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait([waiter], timeout=delay)
+            except BaseException:
+                # 已被唤醒但在恢复运行前被取消（如抓取超时）：把唤醒转交给下一个等待者，否则空出的槽位无人使用
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+            finally:
+                if not waiter.done():
+                    waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        self.active += 1
+        if self.rate > 0:
+            self.tokens -= 1
+        self.counts['requests'] += 1
+        if self.active < int(self.limit):
+            # 还有空余槽位时继续放行下一个等待者
+            self._wake()
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def _wake(self):
+        # 只唤醒一个等待者，条件仍不满足时它会按剩余时间继续等待
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def on_success(self, latency):
+        """请求成功：更新延迟，延迟正常时按成功次数增加并发上限"""
+        self.latency = latency if self.latency is None else (
+            (1 - LATENCY_WEIGHT) * self.latency + LATENCY_WEIGHT * latency)
+        # 基线取近期的最低延迟，缓慢上浮以适应网站整体变慢
+        self.baseline = latency if self.baseline is None else min(latency, self.baseline * 1.02)
+        if not self.adaptive:
+            return
+        if self.latency > LATENCY_FACTOR * self.baseline and self.latency - self.baseline > 0.1:
+            self._decrease()
+            return
+        self._successes += 1
+        required = int(self.limit)
+        if self.ceiling is not None and self.limit + 1 >= self.ceiling:
+            required *= PROBE_FACTOR
+        if self._successes >= required and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+            if self.ceiling is not None and self.limit >= self.ceiling:
+                # 已经越过上次的容忍上限，恢复正常增长
+                self.ceiling = None
+            self._wake()
+
+    def on_throttle(self, retry_after=None):
+        """服务器要求降速（429/503）：暂停该主机并减小并发上限"""
+        self.counts['throttled'] += 1
+        pause = THROTTLE_PAUSE if retry_after is None else min(max(retry_after, 0), HOST_MAX_PAUSE)
+        self.paused_until = max(self.paused_until, self._now() + pause)
+        self._decrease()
+
+    def on_error(self):
+        """连接失败、超时或5xx错误：减小并发上限"""
+        self.counts['errors'] += 1
+        self._decrease()
+
+    def _decrease(self):
+        if not self.adaptive:
+            return
+        now = self._now()
+        # 同一批并发请求同时失败时只减一次，窗口至少为一个平均延迟
+        if now - self._last_decrease < max(self.latency or 0, 0.5):
+            return
+        self._last_decrease = now
+        self.ceiling = self.limit
+        self.limit = max(1.0, self.limit / 2)
+        self._successes = 0
+        self.counts['decreases'] += 1
+
+    def is_idle(self):
+        return not self.active and not self._waiters
+
+    def stats(self):
+        return {
+            'limit': int(self.limit),
+            'active': self.active,
+            'waiting': len(self._waiters),
+            'paused': round(max(0.0, self.paused_until - self._now()), 2),
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            **self.counts,
+        }
@@ -0,0 +1,120 @@
+import os
+import time
+
+# 页面就绪检测配置
+DEFAULT_TIMEOUT = float(os.environ.get('XHB_READY_TIMEOUT', '10'))
+POLL_INTERVAL = 0.1
+QUIET_PERIOD = 0.5
+
+STRATEGIES = ('auto', 'selector', 'mutation', 'network')
+
+# 在页面中安装MutationObserver，返回距离最后一次DOM变化的毫秒数
+_MUTATION_JS = """
+if (!window.__xhbReady) {
+    window.__xhbReady = {last: performance.now()};
+    new MutationObserver(function () {
+        window.__xhbReady.last = performance.now();
+    }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return [document.readyState, performance.now() - window.__xhbReady.last];
+"""
+
+# 返回页面加载状态和已发起的资源请求数
+_NETWORK_JS = """
+return [document.readyState, performance.getEntriesByType('resource').length];
+"""
+
+# 任意一个类名对应的元素存在且非空即视为就绪
+_SELECTOR_JS = """
+var names = arguments[0];
+for (var i = 0; i < names.length; i++) {
+    var found = document.getElementsByClassName(names[i]);
+    for (var j = 0; j < found.length; j++) {
+        if (found[j].children.length > 0 || found[j].textContent.trim().length > 0) {
+            return true;
+        }
+    }
+}
+return false;
+"""
+
+
+def wait_until_ready(driver, strategy='auto', class_names=None, timeout=None):
+    """按指定策略等待页面渲染完成
+
+    - selector: 等待指定类名的元素出现且非空
+    - mutation: 等待DOM在一段时间内不再变化
+    - network: 等待页面加载完成且一段时间内没有新的资源请求
+    - auto: 提供了类名时先等元素出现，再等DOM稳定；否则只等DOM稳定
+
+    所有策略共用同一个超时上限，超时后不抛异常，直接返回False，
+    由调用方继续读取当前的页面内容。
+    """
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    if strategy not in STRATEGIES:
+        strategy = 'auto'
+
+    if strategy == 'selector':
+        return _wait_for_selector(driver, class_names, deadline)
+    if strategy == 'mutation':
+        return _wait_for_mutation_quiet(driver, deadline)
+    if strategy == 'network':
+        return _wait_for_network_idle(driver, deadline)
+
+    if class_names:
+        if not _wait_for_selector(driver, class_names, deadline):
+            return False
+    return _wait_for_mutation_quiet(driver, deadline)
+
+
+def _wait_for_selector(driver, class_names, deadline):
+    if not class_names:
+        return _wait_for_mutation_quiet(driver, deadline)
+    while True:
+        try:
+            if driver.execute_script(_SELECTOR_JS, list(class_names)):
+                return True
+        except Exception:
+            pass
+        if not _sleep_until(deadline):
+            return False
+
+
+def _wait_for_mutation_quiet(driver, deadline):
+    while True:
+        try:
+            ready_state, quiet_ms = driver.execute_script(_MUTATION_JS)
+            if ready_state == 'complete' and quiet_ms >= QUIET_PERIOD * 1000:
+                return True
+        except Exception:
+            pass
+        if not _sleep_until(deadline):
+            return False
+
+
+def _wait_for_network_idle(driver, deadline):
+    last_count = None
+    idle_since = time.monotonic()
+    while True:
+        try:
+            ready_state, count = driver.execute_script(_NETWORK_JS)
+            now = time.monotonic()
+            if count != last_count:
+                last_count = count
+                idle_since = now
+            elif ready_state == 'complete' and now - idle_since >= QUIET_PERIOD:
+                return True
+        except Exception:
+            pass
+        if not _sleep_until(deadline):
+            return False
+
+
+def _sleep_until(deadline):
+    """轮询间隔休眠，已到达超时上限时返回False"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return False
+    time.sleep(min(POLL_INTERVAL, remaining))
+    return True
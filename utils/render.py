@@ -0,0 +1,201 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from utils.browser import SELENIUM_AVAILABLE
+from utils.cache import normalize_url
+from utils.metrics import count
+from utils.parser import make_partial_soup, make_soup
+from utils.plan import class_query
+from utils.singleflight import get_render_flight
+
+logger = logging.getLogger(__name__)
+
+# 自动模式记住每个域名渲染方式的秒数和域名数（可通过环境变量调整）
+RENDER_MEMORY_TTL = float(os.environ.get('XHB_RENDER_MEMORY_TTL', '86400'))
+RENDER_MEMORY_SIZE = int(os.environ.get('XHB_RENDER_MEMORY_SIZE', '1024'))
+# 没有目标类名时，<body>中的可见文字少于该字数视为尚未渲染
+MIN_BODY_TEXT = 200
+
+RENDER_MODES = ('static', 'browser', 'auto')
+
+
+def resolve_render_mode(render_mode, use_browser=False):
+    """确定获取方式：填写了render_mode时以它为准，否则按原来的布尔参数选择"""
+    if render_mode in RENDER_MODES:
+        return render_mode
+    return 'browser' if use_browser else 'static'
+
+
+def has_target_content(html_content, class_names=None):
+    """页面中是否已经有需要的内容
+
+    有类名时，按工具查找元素的三种策略（精确匹配全部类名、单个类名匹配、模糊匹配）
+    任一找到的元素有子元素或文字即可；没有类名时检查<body>中去掉脚本和样式后的可见文字是否足够多。
+    """
+    if not html_content:
+        return False
+    if class_names:
+        query = class_query(' '.join(class_names))
+        soup = make_partial_soup(html_content, [query.class_list], tag_names=())
+        for elements in _target_candidates(soup, query):
+            for element in elements:
+                if element.find(True) is not None or element.get_text(strip=True):
+                    return True
+        return False
+    soup = make_soup(html_content)
+    body = soup.body
+    if body is None:
+        return False
+    for element in body.find_all(['script', 'style', 'noscript', 'template']):
+        element.decompose()
+    return len(body.get_text(strip=True)) >= MIN_BODY_TEXT
+
+
+def _target_candidates(soup, query):
+    """按工具使用的查找策略依次产出候选元素列表"""
+    # 策略1：精确匹配所有类名
+    if query.selector:
+        yield soup.select(query.selector)
+    # 策略2：单个类名匹配
+    for class_name in query.class_list:
+        yield soup.find_all(class_=class_name)
+    # 策略3：包含任意一个类名的元素（模糊匹配），类名不是合法正则时工具同样无法匹配
+    try:
+        patterns = query.patterns
+    except re.error:
+        return
+    for pattern in patterns:
+        yield soup.find_all(class_=pattern)
+
+
+def render_once(url, render, ready_classes=None, wait_strategy='auto', wait_timeout=10):
+    """同时渲染同一网址（规范化后）且等待参数相同的调用只渲染一次，其它调用方等待并得到同一个结果"""
+    key = (normalize_url(url), tuple(ready_classes or ()), wait_strategy, wait_timeout)
+    flight = get_render_flight()
+    if key in flight:
+        count('coalesced_renders')
+        logger.info(f"合并进行中的渲染: {url} (已合并{flight.stats()['shared'] + 1}次)")
+    return flight.do(key, render)
+
+
+class RenderMemory:
+    """按域名记住自动模式的判断结果（static或browser），过期后重新判断"""
+
+    def __init__(self, ttl=RENDER_MEMORY_TTL, max_size=RENDER_MEMORY_SIZE):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'static': 0, 'browser': 0, 'probes': 0, 'escalations': 0}
+
+    def get(self, domain):
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is None:
+                return None
+            decision, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[domain]
+                return None
+            self._entries.move_to_end(domain)
+            self._stats[decision] += 1
+            return decision
+
+    def remember(self, domain, decision):
+        with self._lock:
+            self._entries[domain] = (decision, time.time() + self.ttl)
+            self._entries.move_to_end(domain)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def forget(self, domain=None):
+        """清除指定域名（不指定时清除全部）的判断结果"""
+        with self._lock:
+            if domain is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(domain, None)
+
+    def stats(self):
+        """命中记忆的次数（按结果）、重新判断和升级到浏览器的次数以及记住的域名数"""
+        with self._lock:
+            return {**self._stats, 'domains': len(self._entries)}
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_render_memory():
+    """获取进程级共享的渲染方式记忆"""
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = RenderMemory()
+    return _memory
+
+
+def fetch_auto(url, class_names, fetch_static, fetch_browser, browser_available=SELENIUM_AVAILABLE):
+    """自动模式：先用普通模式获取，缺少目标内容时才升级到浏览器，并按域名记住结果
+
+    - 记住的是browser时直接使用浏览器，是static时只用普通模式
+    - 没有记忆时先用普通模式获取并检查目标内容，有内容则记为static
+    - 缺少内容（或普通模式获取失败）时用浏览器渲染，渲染后有内容则记为browser；
+      渲染后仍然没有，说明与渲染方式无关，记为static并返回普通模式的结果
+    - 渲染失败（抛出异常或返回None）时返回普通模式的结果，不记住，下次重新判断
+    - 没有安装selenium时只使用普通模式
+    """
+    memory = get_render_memory()
+    domain = urlparse(url).netloc.lower()
+    decision = memory.get(domain)
+    if decision == 'browser' and browser_available:
+        return fetch_browser(url)
+
+    static_error = None
+    try:
+        html_content = fetch_static(url)
+    except Exception as e:
+        html_content, static_error = None, e
+    if decision == 'static' or not browser_available:
+        if static_error is not None:
+            raise static_error
+        return html_content
+
+    memory.record('probes')
+    if html_content and has_target_content(html_content, class_names):
+        memory.remember(domain, 'static')
+        return html_content
+
+    memory.record('escalations')
+    count('escalations')
+    try:
+        rendered = fetch_browser(url)
+    except Exception:
+        # 浏览器不可用（如未安装Chrome）时退回普通模式的结果，不记住
+        if html_content:
+            return html_content
+        raise
+    if rendered is None:
+        # listlink、htmlextract渲染出错时返回None，同样视为失败，不能记为static
+        if static_error is not None:
+            raise static_error
+        return html_content
+    if rendered and has_target_content(rendered, class_names):
+        memory.remember(domain, 'browser')
+        return rendered
+    if html_content:
+        memory.remember(domain, 'static')
+        return html_content
+    if static_error is not None and not rendered:
+        raise static_error
+    return rendered
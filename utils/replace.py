@@ -0,0 +1,67 @@
+import re
+from functools import lru_cache
+
+
+class MultiReplacer:
+    """一次扫描完成多个目标的替换和删除
+
+    所有目标编译成一个按前缀树组织的正则（公共前缀只比较一次），扫描规则：
+    - 从左到右扫描，同一位置有多个目标匹配时取最长的一个
+    - 替换后的文本不会再被扫描，不会出现连锁替换
+    - 同一目标出现多次时以第一次出现的规则为准
+    """
+
+    __slots__ = ('mapping', 'pattern')
+
+    def __init__(self, rules):
+        self.mapping = {}
+        for target, replacement in rules:
+            if target and target not in self.mapping:
+                self.mapping[target] = replacement
+        self.pattern = re.compile(_trie_regex(self.mapping)) if self.mapping else None
+
+    def __bool__(self):
+        return self.pattern is not None
+
+    def apply(self, text):
+        if not text or self.pattern is None:
+            return text
+        mapping = self.mapping
+        return self.pattern.sub(lambda match: mapping[match.group(0)], text)
+
+
+def _trie_regex(words):
+    """把一组字面量编译成前缀树形式的正则，较长的分支优先，保证同一位置取最长匹配"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return _node_regex(trie)
+
+
+def _node_regex(node):
+    is_end = '' in node
+    branches = []
+    for char in sorted(key for key in node if key):
+        child = node[char]
+        # 压缩单链路径，减少分组嵌套
+        literal = re.escape(char)
+        while len(child) == 1 and '' not in child:
+            (char, child), = child.items()
+            literal += re.escape(char)
+        branches.append(literal + _node_regex(child) if child.keys() - {''} else literal)
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    # 当前节点本身也是一个完整目标时，后续部分可选（贪婪匹配优先取更长的目标）
+    if is_end:
+        return '(?:' + body + ')?'
+    return body
+
+
+@lru_cache(maxsize=64)
+def compile_replacer(rules):
+    """获取(目标, 替换文本)规则元组对应的MultiReplacer（跨调用缓存）"""
+    return MultiReplacer(rules)
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# 已见链接库的位置（可通过环境变量调整）
+SEEN_DB = os.environ.get(
+    'XHB_SEEN_DB',
+    os.path.join(os.path.expanduser('~'), '.cache', 'xhbtool', 'seen.sqlite3'),
+)
+
+# 单条IN查询的参数个数，低于旧版SQLite的999个变量上限
+_QUERY_CHUNK = 500
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS feeds (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)',
+    # 每条记录只存来源编号和16字节的URL摘要，WITHOUT ROWID让主键索引即数据本身
+    'CREATE TABLE IF NOT EXISTS seen ('
+    ' feed INTEGER NOT NULL,'
+    ' url_hash BLOB NOT NULL,'
+    ' seen_at INTEGER NOT NULL,'
+    ' PRIMARY KEY (feed, url_hash)'
+    ') WITHOUT ROWID',
+)
+
+
+def seen_url(url):
+    """用于比较的链接：只把协议和主机转为小写
+
+    保留#片段（哈希路由的单页应用靠它区分文章）、查询参数顺序和端口，不能使用HTTP缓存键。
+    """
+    parts = urlsplit(url.strip())
+    userinfo, at, host = parts.netloc.rpartition('@')
+    return urlunsplit((parts.scheme.lower(), userinfo + at + host.lower(), parts.path, parts.query, parts.fragment))
+
+
+def url_key(url):
+    """链接的存储键：seen_url()的SHA-1前16字节"""
+    return hashlib.sha1(seen_url(url).encode('utf-8')).digest()[:16]
+
+
+class SeenStore:
+    """按来源标识（feed）持久化记录已返回过的链接
+
+    基于SQLite主键索引，查询是O(log n)的B树查找，几百万条记录时单次批量过滤仍在毫秒级。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or SEEN_DB
+        self._lock = threading.Lock()
+        self._feed_ids = {}
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            # WAL允许多个进程同时读写（多个工作流同时运行时）
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _feed_id(self, conn, feed, create):
+        if feed in self._feed_ids:
+            return self._feed_ids[feed]
+        row = conn.execute('SELECT id FROM feeds WHERE name = ?', (feed,)).fetchone()
+        if row is None:
+            if not create:
+                return None
+            row = (conn.execute('INSERT INTO feeds (name) VALUES (?)', (feed,)).lastrowid,)
+            conn.commit()
+        self._feed_ids[feed] = row[0]
+        return row[0]
+
+    def filter_unseen(self, feed, urls, mark=True):
+        """返回(未见过的链接, 跳过的数量)，保持原有顺序
+
+        mark为True时把返回的链接记为已见，下次调用不再返回。
+        """
+        keys = [(url, url_key(url)) for url in urls]
+        with self._lock:
+            conn = self._connect()
+            feed_id = self._feed_id(conn, feed, create=mark)
+            existing = set()
+            if feed_id is not None:
+                for start in range(0, len(keys), _QUERY_CHUNK):
+                    chunk = [key for _, key in keys[start:start + _QUERY_CHUNK]]
+                    rows = conn.execute(
+                        'SELECT url_hash FROM seen WHERE feed = ? AND url_hash IN (%s)' % ','.join('?' * len(chunk)),
+                        [feed_id, *chunk],
+                    )
+                    existing.update(row[0] for row in rows)
+
+            unseen = []
+            new_keys = []
+            for url, key in keys:
+                if key in existing:
+                    continue
+                # 只有协议、主机大小写不同的链接在同一批中也只返回一次
+                existing.add(key)
+                unseen.append(url)
+                new_keys.append(key)
+
+            if mark:
+                self._insert(conn, feed_id, new_keys)
+
+        skipped = len(keys) - len(unseen)
+        logger.info("已见链接过滤 %s: 新链接 %d, 跳过 %d", feed, len(unseen), skipped)
+        return unseen, skipped
+
+    def mark(self, feed, urls):
+        """把链接记为已见"""
+        keys = [url_key(url) for url in urls]
+        with self._lock:
+            conn = self._connect()
+            self._insert(conn, self._feed_id(conn, feed, create=True), keys)
+
+    def _insert(self, conn, feed_id, keys):
+        if not keys:
+            return
+        now = int(time.time())
+        conn.executemany(
+            'INSERT OR IGNORE INTO seen (feed, url_hash, seen_at) VALUES (?, ?, ?)',
+            [(feed_id, key, now) for key in keys],
+        )
+        conn.commit()
+
+    def count(self, feed):
+        """返回来源已记录的链接数"""
+        with self._lock:
+            conn = self._connect()
+            feed_id = self._feed_id(conn, feed, create=False)
+            if feed_id is None:
+                return 0
+            return conn.execute('SELECT COUNT(*) FROM seen WHERE feed = ?', (feed_id,)).fetchone()[0]
+
+    def clear(self, feed=None):
+        """清空指定来源（不指定时清空全部）的记录"""
+        with self._lock:
+            conn = self._connect()
+            if feed is None:
+                conn.execute('DELETE FROM seen')
+            else:
+                feed_id = self._feed_id(conn, feed, create=False)
+                if feed_id is not None:
+                    conn.execute('DELETE FROM seen WHERE feed = ?', (feed_id,))
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_seen_store():
+    """获取进程级共享的已见链接库"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SeenStore()
+    return _store
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+
+
+class _Call:
+    """一次进行中的调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    """合并并发的相同调用（线程/greenlet之间）
+
+    同一个键同时只执行一次func，其它调用方等待它完成并得到同一个结果或异常。
+    执行方被中断（如greenlet被杀死）时，等待的调用方重新竞争执行。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'shared': 0}
+
+    def do(self, key, func):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self._stats['calls'] += 1
+                else:
+                    self._stats['shared'] += 1
+            if leader:
+                return self._run(key, call, func)
+            call.done.wait()
+            if call.abandoned:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def _run(self, key, call, func):
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.abandoned = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """实际执行次数、合并掉的重复调用次数和进行中的调用数"""
+        with self._lock:
+            return {**self._stats, 'in_flight': len(self._calls)}
+
+
+class _Flight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """合并事件循环中并发的相同协程
+
+    同一个键同时只运行一个任务，其它调用方等待同一个任务的结果。
+    单个调用方被取消（如超过抓取时限）不影响其它调用方，全部调用方都取消后才取消任务，
+    任务占用的主机槽位随之释放。只在抓取引擎的事件循环中使用，不需要加锁。
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._stats = {'calls': 0, 'shared': 0}
+
+    async def do(self, key, factory):
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(factory()))
+            flight.task.add_done_callback(lambda task: self._discard(key, flight))
+            self._stats['calls'] += 1
+        else:
+            self._stats['shared'] += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # 最后一个调用方也不再等待，取消任务；之后的调用重新开始
+                self._discard(key, flight)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def __contains__(self, key):
+        return key in self._flights
+
+    def _discard(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self):
+        return {**self._stats, 'in_flight': len(self._flights)}
+
+
+_fetch_flight = AsyncSingleFlight()
+_render_flight = SingleFlight()
+
+
+def get_fetch_flight():
+    """普通模式下载共用的合并器（在抓取引擎的事件循环中使用）"""
+    return _fetch_flight
+
+
+def get_render_flight():
+    """浏览器渲染共用的合并器"""
+    return _render_flight
+
+
+def flight_stats():
+    """各获取方式实际执行的次数（calls）、合并掉的重复请求数（shared）和进行中的请求数"""
+    return {'static': _fetch_flight.stats(), 'browser': _render_flight.stats()}